@@ -1,7 +1,11 @@
 import streamlit as st
 import requests
 import isodate
+import time
 from datetime import datetime
+from video_ids import parse_video_id
+
+API_URL = "http://127.0.0.1:5000"
 
 st.set_page_config(layout="wide")
 st.title("🎬 YouTube Video Info & AI Summary")
@@ -13,13 +17,9 @@ with col1:
 with col2:
     submit_button = st.button("📥 Obtenir les infos")
 
-# ➤ Fonction pour extraire l'ID de la vidéo YouTube
+# ➤ Fonction pour extraire l'ID de la vidéo YouTube (même règle que l'API)
 def extract_video_id(url):
-    if "v=" in url:
-        return url.split("v=")[-1].split("&")[0]
-    elif "youtu.be/" in url:
-        return url.split("youtu.be/")[-1].split("?")[0]
-    return None
+    return parse_video_id(url)
 
 # ➤ Conversion de la date ISO 8601 en format lisible
 def format_date(iso_date):
@@ -38,17 +38,54 @@ def format_duration(iso_duration):
     except:
         return iso_duration
 
+# ➤ Analyse en arrière-plan : création du job (retourne son identifiant)
+def submit_analysis(video_url):
+    response = requests.post(f"{API_URL}/jobs", json={"url": video_url}, timeout=10)
+    if response.status_code != 202:
+        return None
+    return response.json()["id"]
+
+# ➤ Attente du résultat d'un job d'analyse
+def wait_for_analysis(job_id, poll_interval=2, max_wait=600):
+    if not job_id:
+        return None
+
+    deadline = time.time() + max_wait
+    while time.time() < deadline:
+        job = requests.get(f"{API_URL}/jobs/{job_id}", timeout=10).json()
+        if job["status"] == "done":
+            return job["result"] if job.get("status_code") == 200 else None
+        if job["status"] == "failed":
+            return None
+        time.sleep(poll_interval)
+    return None
+
+# ➤ Métadonnées seules (rapide, sans passer par Gemini)
+def fetch_video_metadata(video_url):
+    response = requests.get(f"{API_URL}/video_info/batch", params={"url": video_url}, timeout=10)
+    if response.status_code != 200:
+        return None
+    video = response.json()["videos"][0]
+    return None if "error" in video else video
+
+# ➤ Résumé IA reçu morceau par morceau pendant sa génération
+def stream_summary(video_url):
+    with requests.get(f"{API_URL}/summary/stream", params={"url": video_url}, stream=True, timeout=(10, 300)) as response:
+        if response.status_code != 200:
+            yield "Résumé non disponible."
+            return
+        for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+            yield chunk
+
 # ➤ Récupération des infos si le bouton est cliqué
 if submit_button and video_url:
     video_id = extract_video_id(video_url)
     if not video_id:
         st.error("❌ URL YouTube invalide.")
     else:
-        api_url = f"http://127.0.0.1:5000/video_info?url={video_url}"
-        response = requests.get(api_url)
+        video_info = fetch_video_metadata(video_url)
 
-        if response.status_code == 200:
-            video_info = response.json()
+        if video_info:
 
             # ➤ Informations Générales et Résumé
             st.markdown("---")
@@ -60,9 +97,13 @@ if submit_button and video_url:
                 st.write(f"👍 **Likes :** {int(video_info['likeCount']):,}")
                 st.write(f"⏳ **Durée :** {format_duration(video_info['duration'])}")
 
+            # Le job d'analyse tourne côté worker pendant que le résumé s'affiche ; les deux
+            # demandent le même prompt à Gemini, généré une seule fois (verrou de génération de llm)
+            job_id = submit_analysis(video_url)
+
             with col2:
                 st.subheader("📑 Résumé IA")
-                st.write(video_info.get("summary", "Résumé non disponible."))
+                st.write_stream(stream_summary(video_url))
             st.markdown("---")
 
             # ➤ Vidéo (Row unique)
@@ -78,8 +119,10 @@ if submit_button and video_url:
 
             # ➤ Chapitres (Stylisés)
             st.subheader("📖 Chapitres")
-            chapters = video_info.get("chapters", [])
-            if chapters:
+            with st.spinner("⏳ Découpage de la vidéo en chapitres..."):
+                analysis = wait_for_analysis(job_id)
+            chapters = analysis.get("chapters", []) if analysis else []
+            if isinstance(chapters, list) and chapters:
                 for chapter in chapters:
                     st.markdown(
                         f"""
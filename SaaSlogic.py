@@ -1,109 +1,174 @@
-from flask import Flask, request, jsonify
-from youtube_transcript_api import YouTubeTranscriptApi
-import googleapiclient.discovery
+from flask import Flask, g, Response, request, jsonify, stream_with_context
+from concurrent.futures import as_completed
 import os
 import json
+import math
 from dotenv import load_dotenv
-import google.generativeai as genai
+from transcripts import fetch_transcript, join_text, transcript_cache
+from aligner import chapter_times
+from youtube_client import get_youtube_client, execute
+from prewarm import prewarm
+from llm import generate_text, stream_text, response_cache
+from mapreduce import needs_map_reduce, summarize_map_reduce, segment_map_reduce, map_summaries, build_reduce_prompt
+from stages import submit, stage_result
+from token_budget import start_ledger, summarize_ledger, usage_totals
+from jobs import JobQueue
+from timefmt import TIME_FORMATS, DEFAULT_TIME_FORMAT, format_chapters
+from video_ids import parse_video_id
+from singleflight import SingleFlight
+from hedging import gemini_hedger
+from outbound import UpstreamUnavailable, is_transient, upstream_stats
 
 # Charger les variables d'environnement
 load_dotenv()
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-# Configurer l'API Gemini
-genai.configure(api_key=GEMINI_API_KEY)
+# L'API Gemini est configurée au premier appel (llm.get_model), ou au démarrage par prewarm()
 
 app = Flask(__name__)
 
+# "lines" : la transcription est numérotée et Gemini ne renvoie que les numéros de ligne de chaque chapitre
+# "script" : Gemini recopie le texte de chaque chapitre, retrouvé ensuite dans la transcription
+SEGMENTATION_MODE = os.getenv("SEGMENTATION_MODE", "lines")
+job_queue = JobQueue()
+# Analyses simultanées de la même vidéo : un seul pipeline, partagé entre requêtes et workers
+analysis_flight = SingleFlight("video_analyses")
+
+# Limite de l'API YouTube : 50 ids par appel videos().list
+VIDEOS_LIST_MAX_IDS = 50
+MAX_BATCH_SIZE = 500
+
+def format_video_info(video):
+    """ Extrait les champs utiles d'un item videos().list """
+    return {
+        "title": video["snippet"]["title"],
+        "description": video["snippet"]["description"],
+        "publishedAt": video["snippet"]["publishedAt"],
+        "viewCount": video["statistics"].get("viewCount", "N/A"),
+        "likeCount": video["statistics"].get("likeCount", "N/A"),
+        "duration": video["contentDetails"]["duration"],
+    }
+
 def get_youtube_video_info(video_id):
     """ Récupère les informations d'une vidéo YouTube """
-    youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
+    youtube = get_youtube_client()
     
     request = youtube.videos().list(
         part="snippet,statistics,contentDetails",
         id=video_id
     )
-    response = request.execute()
+    response = execute(request)
 
     if not response["items"]:
         return None
 
-    video = response["items"][0]
-    info = {
-        "title": video["snippet"]["title"],
-        "description": video["snippet"]["description"],
-        "publishedAt": video["snippet"]["publishedAt"],
-        "viewCount": video["statistics"].get("viewCount", "N/A"),
-        "likeCount": video["statistics"].get("likeCount", "N/A"),
-        "duration": video["contentDetails"]["duration"],
-    }
-    return info
+    return format_video_info(response["items"][0])
+
+def get_youtube_videos_info(video_ids):
+    """ Récupère les informations de plusieurs vidéos, par paquets de 50 ids """
+    youtube = get_youtube_client()
+    infos = {}
+
+    for i in range(0, len(video_ids), VIDEOS_LIST_MAX_IDS):
+        chunk = video_ids[i:i + VIDEOS_LIST_MAX_IDS]
+        response = execute(youtube.videos().list(
+            part="snippet,statistics,contentDetails",
+            id=",".join(chunk)
+        ))
+        for video in response.get("items", []):
+            infos[video["id"]] = format_video_info(video)
 
-def get_video_transcription(video_id):
-    """Récupère la transcription en français ou en anglais si indisponible"""
+    return infos
+
+def get_video_transcription(video_id, failed_stages=None):
+    """Récupère la transcription en français ou en anglais si indisponible
+
+    Un échec passager (quota, disjoncteur, erreur réseau) est noté dans
+    failed_stages ; une vidéo sans sous-titres ne l'est pas.
+    """
     try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['fr', 'en'])
+        transcript = fetch_transcript(video_id)
         return transcript
     except Exception as e:
         print(f"Erreur : {e}")
+        if failed_stages is not None and is_transient(e):
+            failed_stages.append("transcription")
         return None
 
 
-def format_timestamp(seconds):
-    """ Convertit un timestamp en hh:mm:ss """
-    hours, remainder = divmod(int(seconds), 3600)
-    minutes, seconds = divmod(remainder, 60)
-    return f"{hours:02}:{minutes:02}:{seconds:02}"
+def build_summary_prompt(transcription):
+    """ Construit le prompt de résumé """
+    full_text = join_text(transcription, " ")
+    return f"""
+    Résume cette transcription de manière claire et concise et assure toi que tu me rende le resuméé en français :
+    
+    {full_text}
 
-def hhmmss_to_seconds(timestamp):
-    """ Convertit un timestamp hh:mm:ss en secondes """
-    h, m, s = map(int, timestamp.split(":"))
-    return h * 3600 + m * 60 + s
+    Résumé :
+    """
 
-def get_transcript_with_timestamps(video_id):
-    """ Récupère la transcription avec timestamps """
-    try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['fr', 'en'])
-        return [
-            {
-                "sentence": entry["text"],
-                "start_time": format_timestamp(entry["start"]),
-                "end_time": format_timestamp(entry["start"] + entry["duration"])
-            }
-            for entry in transcript
-        ]
-    except Exception:
-        return None
+SUMMARY_ERROR = "Erreur lors de la génération du résumé."
 
 def generate_summary(transcription):
     """ Génère un résumé avec Gemini """
     if not transcription:
         return "Résumé non disponible."
 
-    full_text = " ".join([entry["text"] for entry in transcription])
-    prompt = f"""
-    Résume cette transcription de manière claire et concise et assure toi que tu me rende le resuméé en français :
-    
-    {full_text}
+    try:
+        # Transcriptions très longues : résumés partiels en parallèle puis fusion
+        if needs_map_reduce(transcription):
+            summary = summarize_map_reduce(transcription, build_summary_prompt)
+        else:
+            summary = generate_text(build_summary_prompt(transcription), hedge=True)
+        return summary or "Résumé non disponible."
+    except Exception:
+        return SUMMARY_ERROR
+
+def generate_summary_stream(transcription):
+    """ Génère le résumé morceau par morceau, au rythme de Gemini """
+    if not transcription:
+        yield "Résumé non disponible."
+        return
 
-    Résumé :
-    """
-    
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        return response.text.strip() if response and hasattr(response, 'text') else "Résumé non disponible."
+        if needs_map_reduce(transcription):
+            # Seule la fusion finale est diffusée au fil de l'eau
+            yield from stream_text(build_reduce_prompt(map_summaries(transcription, build_summary_prompt)))
+        else:
+            yield from stream_text(build_summary_prompt(transcription))
     except Exception:
-        return "Erreur lors de la génération du résumé."
+        yield SUMMARY_ERROR
 
 def segment_transcription_by_topics(transcription):
     """ Segmente la transcription en chapitres thématiques """
     if not transcription:
         return None
+    if needs_map_reduce(transcription):
+        return segment_map_reduce(transcription, segment_transcription_by_topics)
+
+    try:
+        text = generate_text(build_segmentation_prompt(transcription), hedge=True)
+        return parse_chapters(text)
+    except Exception:
+        return None
 
-    full_text = "\n".join(entry["text"] for entry in transcription)
-    prompt = f"""
+def build_segmentation_prompt(transcription):
+    """ Construit le prompt de segmentation (numéros de ligne ou texte recopié selon SEGMENTATION_MODE) """
+    if SEGMENTATION_MODE == "lines":
+        numbered_text = "\n".join(f"[{i}] {entry['text']}" for i, entry in enumerate(transcription))
+        return f"""
+    Segmente ce texte en chapitres basés sur les sujets abordés.
+    Chaque ligne de la transcription commence par son numéro entre crochets.
+    Retourne une liste de chapitres au format JSON, sans recopier la transcription :
+    [
+      {{"title": "Nom du chapitre", "content": "Description courte du chapitre", "start_line": 0, "end_line": 41}}
+    ]
+    Les chapitres se suivent : le start_line d'un chapitre est le end_line du précédent + 1.
+    Transcription :
+    {numbered_text}
+    Assure-toi que la réponse soit bien formatée en JSON.
+    """
+    else:
+        full_text = join_text(transcription, "\n")
+        return f"""
     Segmente ce texte en chapitres basés sur les sujets abordés.
     Retourne une liste de chapitres au format JSON :
     [
@@ -113,74 +178,351 @@ def segment_transcription_by_topics(transcription):
     {full_text}
     Assure-toi que la réponse soit bien formatée en JSON.
     """
-    
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        return json.loads(response.text.strip().replace("```json", "").replace("```", "").strip())
-    except Exception:
-        return None
+
+def parse_chapters(text):
+    """ Chapitres JSON renvoyés par Gemini, sans les balises ```json """
+    return json.loads(text.replace("```json", "").replace("```", "").strip())
 
 def assign_timestamps(chapters, transcript):
-    """ Associe chaque chapitre à un timestamp """
+    """ Associe à chaque chapitre son début et sa fin en secondes (transcription brute : text, start, duration) """
     if not chapters or not transcript:
         return None
 
+    # Numéros de ligne si la segmentation les fournit, sinon index de n-grammes sur le script
+    starts, ends = chapter_times(chapters, transcript)
+
     timestamped_chapters = []
-    previous_end_time = None
-    current_index = 0
+    previous_end = None
+
+    for chapter, start, end in zip(chapters, starts.tolist(), ends.tolist()):
+        # Sans ancre de début, le chapitre commence où le précédent s'arrête
+        if math.isnan(start):
+            start = previous_end if previous_end is not None else transcript[0]["start"]
+        # Les chapitres ne se chevauchent pas et le temps ne recule jamais
+        if previous_end is not None:
+            start = max(start, previous_end)
+        end = None if math.isnan(end) else max(end, start)
 
-    for chapter in chapters:
-        script_words = chapter["script"].split()
-        last_10_words = " ".join(script_words[-15:])
-        
-        start_time = previous_end_time or transcript[0]["start_time"]
-        end_time = None
-
-        for i in range(current_index, len(transcript)):
-            entry = transcript[i]
-            if entry["sentence"] in last_10_words:
-                end_time = entry["end_time"]
-                current_index = i
-                break
-        
         timestamped_chapters.append({
             "title": chapter["title"],
             "content": chapter["content"],
-            "start_time": start_time,
-            "end_time": end_time or start_time
+            # Secondes : le format d'affichage est choisi par le client, à la sérialisation
+            "start_time": start,
+            "end_time": end if end is not None else start
         })
         
-        previous_end_time = end_time or previous_end_time
+        previous_end = end if end is not None else start
 
     return timestamped_chapters
 
+def iter_video_analysis(video_id, failed_stages=None):
+    """ Pipeline complet, qui produit chaque partie dès qu'elle est prête
+
+    Génère des couples (partie, données) : "metadata", "transcription", puis
+    "summary" et "chapters" dans l'ordre où ils se terminent. En cas d'échec
+    des métadonnées, une seule partie "error" est produite.
+
+    Les étapes remplacées par leur message de repli après un échec à
+    retenter sont ajoutées à failed_stages : le résultat est alors partiel.
+    """
+    failed_stages = failed_stages if failed_stages is not None else []
+    # Métadonnées et transcription sont indépendantes : on les lance en parallèle
+    info_future = submit(get_youtube_video_info, video_id)
+    transcription_future = submit(get_video_transcription, video_id, failed_stages)
+
+    try:
+        video_info = info_future.result()
+    except UpstreamUnavailable as e:
+        # Circuit ouvert ou quota épuisé : le client peut réessayer plus tard
+        print(f"Erreur : {e}")
+        yield "error", {"error": "Service YouTube momentanément indisponible", "status": 503}
+        return
+    except Exception as e:
+        print(f"Erreur : {e}")
+        yield "error", {"error": "Erreur lors de la récupération des informations", "status": 502}
+        return
+    if not video_info:
+        yield "error", {"error": "Vidéo non trouvée", "status": 404}
+        return
+    yield "metadata", video_info
+
+    transcription = stage_result(transcription_future, None, "transcription")
+    yield "transcription", transcription.to_list() if transcription else "Transcription non disponible."
+
+    # Résumé et segmentation ne dépendent que de la transcription
+    summary_future = submit(generate_summary, transcription)
+    chapters_future = submit(segment_transcription_by_topics, transcription)
+
+    for future in as_completed([summary_future, chapters_future]):
+        if future is summary_future:
+            summary = stage_result(summary_future, SUMMARY_ERROR, "résumé")
+            if summary == SUMMARY_ERROR:
+                failed_stages.append("résumé")
+            yield "summary", summary
+        else:
+            chapters = stage_result(chapters_future, None, "chapitres")
+            timestamped_chapters = assign_timestamps(chapters, transcription)
+            if transcription and not timestamped_chapters:
+                failed_stages.append("chapitres")
+            yield "chapters", timestamped_chapters or "Chapitres non disponibles."
+
+def analyze_video(video_id, failed_stages=None):
+    """ Pipeline complet : infos, transcription, résumé et chapitres. Retourne (réponse, code HTTP) """
+    video_info = {}
+    for part, data in iter_video_analysis(video_id, failed_stages):
+        if part == "error":
+            return {"error": data["error"]}, data["status"]
+        if part == "metadata":
+            video_info.update(data)
+        else:
+            video_info[part] = data
+
+            # Ajout du print pour voir le JSON des chapitres
+    print(json.dumps(video_info["chapters"], indent=4, ensure_ascii=False))
+
+    return video_info, 200
+
+def analyze_video_shared(video_id):
+    """ analyze_video mutualisé : les requêtes simultanées pour la même vidéo partagent le calcul
+
+    Retourne (réponse, code HTTP, étapes en échec).
+    """
+    def analyze():
+        failed_stages = []
+        video_info, status_code = analyze_video(video_id, failed_stages)
+        return video_info, status_code, failed_stages
+
+    return analysis_flight.do(video_id, analyze, shareable=is_complete_analysis)
+
+def is_complete_analysis(result):
+    """ Seules les analyses définitives sont publiées : pas d'erreur amont (5xx) ni d'étape en échec """
+    _, status_code, failed_stages = result
+    return status_code < 500 and not failed_stages
+
+def invalid_url_error():
+    return jsonify({"error": "URL YouTube invalide"}), 400
+
+def requested_time_format():
+    """ Format des temps demandé (?time_format=hms|seconds|iso), ou None s'il est inconnu """
+    time_format = request.args.get("time_format", DEFAULT_TIME_FORMAT)
+    return time_format if time_format in TIME_FORMATS else None
+
+def time_format_error():
+    return jsonify({"error": f"time_format doit valoir {', '.join(TIME_FORMATS)}"}), 400
+
+def format_analysis(video_info, time_format):
+    """ Résultat d'analyse prêt à sérialiser, temps des chapitres formatés """
+    if "chapters" not in video_info:
+        return video_info
+    return {**video_info, "chapters": format_chapters(video_info["chapters"], time_format)}
+
 @app.route("/video_info", methods=["GET"])
 def get_video_info():
     """ API pour récupérer les infos, résumé et chapitres d'une vidéo """
     video_url = request.args.get("url")
     if not video_url:
         return jsonify({"error": "Aucune URL fournie"}), 400
+    time_format = requested_time_format()
+    if not time_format:
+        return time_format_error()
 
-    video_id = video_url.split("v=")[-1]
-    video_info = get_youtube_video_info(video_id)
-    if not video_info:
-        return jsonify({"error": "Vidéo non trouvée"}), 404
+    video_id = parse_video_id(video_url)
+    if not video_id:
+        return invalid_url_error()
+    video_info, status_code, _ = analyze_video_shared(video_id)
+    return jsonify(format_analysis(video_info, time_format)), status_code
+
+@app.route("/video_info/stream", methods=["GET"])
+def stream_video_info():
+    """ Variante progressive de /video_info : chaque partie est envoyée dès qu'elle est prête
+
+    format=ndjson (par défaut) : une ligne JSON {"event": ..., "data": ...} par partie
+    format=sse : Server-Sent Events
+    time_format=hms (par défaut), seconds ou iso : format des temps des chapitres
+    """
+    video_url = request.args.get("url")
+    if not video_url:
+        return jsonify({"error": "Aucune URL fournie"}), 400
+    time_format = requested_time_format()
+    if not time_format:
+        return time_format_error()
+
+    video_id = parse_video_id(video_url)
+    if not video_id:
+        return invalid_url_error()
+    use_sse = request.args.get("format", "ndjson") == "sse"
 
+    def generate():
+        for part, data in iter_video_analysis(video_id):
+            if part == "chapters":
+                data = format_chapters(data, time_format)
+            if use_sse:
+                yield f"event: {part}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            else:
+                yield json.dumps({"event": part, "data": data}, ensure_ascii=False) + "\n"
+        if use_sse:
+            yield "event: done\ndata: {}\n\n"
+        else:
+            yield json.dumps({"event": "done", "data": {}}) + "\n"
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream" if use_sse else "application/x-ndjson",
+        # Désactive la mise en tampon des proxys (nginx) pour que chaque partie parte tout de suite
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/summary/stream", methods=["GET"])
+def stream_summary():
+    """ Résumé IA envoyé en texte brut au fil de la génération """
+    video_url = request.args.get("url")
+    if not video_url:
+        return jsonify({"error": "Aucune URL fournie"}), 400
+
+    video_id = parse_video_id(video_url)
+    if not video_id:
+        return invalid_url_error()
     transcription = get_video_transcription(video_id)
-    summary = generate_summary(transcription)
-    transcript_with_timestamps = get_transcript_with_timestamps(video_id)
-    chapters = segment_transcription_by_topics(transcription)
-    timestamped_chapters = assign_timestamps(chapters, transcript_with_timestamps)
 
-    video_info["summary"] = summary
-    video_info["transcription"] = transcription or "Transcription non disponible."
-    video_info["chapters"] = timestamped_chapters or "Chapitres non disponibles."
+    return Response(
+        stream_with_context(generate_summary_stream(transcription)),
+        mimetype="text/plain; charset=utf-8",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def run_analysis_job(payload):
+    """ Exécute un job d'analyse ; les erreurs amont (5xx) et les analyses partielles sont relancées pour être retentées """
+    ledger = start_ledger()
+    video_info, status_code, failed_stages = analyze_video_shared(payload["video_id"])
+    print(f"Tokens LLM job {payload['video_id']} : {summarize_ledger(ledger)}")
+    if status_code >= 500:
+        raise RuntimeError(video_info.get("error", "Erreur amont"))
+    if failed_stages:
+        raise RuntimeError(f"Analyse partielle, étapes en échec : {', '.join(failed_stages)}")
+    return {"status_code": status_code, "body": video_info}
 
-            # Ajout du print pour voir le JSON des chapitres
-    print(json.dumps(video_info["chapters"], indent=4, ensure_ascii=False))
+@app.route("/jobs", methods=["POST"])
+def create_job():
+    """ Lance l'analyse d'une vidéo en arrière-plan et retourne l'identifiant du job """
+    payload = request.get_json(silent=True)
+    payload = payload if isinstance(payload, dict) else {}
+    video_url = payload.get("url") or request.args.get("url")
+    if not video_url:
+        return jsonify({"error": "Aucune URL fournie"}), 400
+
+    video_id = parse_video_id(video_url)
+    if not video_id:
+        return invalid_url_error()
+    job_id = job_queue.enqueue({"video_id": video_id})
+    return jsonify({"id": job_id, "status": "queued"}), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """ Retourne l'état d'un job et, une fois terminé, le résultat de l'analyse """
+    time_format = requested_time_format()
+    if not time_format:
+        return time_format_error()
+    job = job_queue.get(job_id)
+    if not job:
+        return jsonify({"error": "Job introuvable"}), 404
+
+    return jsonify(job_status(job, time_format))
 
-    return jsonify(video_info)
+def job_status(job, time_format):
+    """ État d'un job et, une fois terminé, son résultat formaté """
+    response = {
+        "id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "error": job["error"],
+    }
+    if job["result"]:
+        response["status_code"] = job["result"]["status_code"]
+        response["result"] = format_analysis(job["result"]["body"], time_format)
+    return response
+
+@app.route("/video_info/batch", methods=["GET", "POST"])
+def get_video_info_batch():
+    """ API pour récupérer les métadonnées de plusieurs vidéos (sans résumé ni chapitres) """
+    if request.method == "POST":
+        payload = request.get_json(silent=True)
+        payload = payload if isinstance(payload, dict) else {}
+        video_urls = payload.get("urls") or payload.get("ids") or []
+    else:
+        video_urls = request.args.getlist("url") or request.args.getlist("id")
+
+    if not video_urls:
+        return jsonify({"error": "Aucune URL fournie"}), 400
+    if not is_url_list(video_urls):
+        return jsonify({"error": "urls doit être une liste de chaînes"}), 400
+    if len(video_urls) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Maximum {MAX_BATCH_SIZE} vidéos par requête"}), 400
+
+    return jsonify({"videos": batch_video_infos(video_urls)})
+
+def is_url_list(value):
+    """ Vrai si value est une liste de chaînes (et non une chaîne seule, qu'on itérerait caractère par caractère) """
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+def batch_video_infos(video_urls):
+    """ Métadonnées de chaque vidéo de la liste, ou l'erreur qui la concerne """
+    parsed_ids = [parse_video_id(video_url) for video_url in video_urls]
+    video_ids = list(dict.fromkeys(video_id for video_id in parsed_ids if video_id))
+    infos = get_youtube_videos_info(video_ids) if video_ids else {}
+
+    # Dans l'ordre de la requête ; une vidéo demandée plusieurs fois n'apparaît qu'à sa première position
+    videos = []
+    seen = set()
+    for video_url, video_id in zip(video_urls, parsed_ids):
+        if not video_id:
+            videos.append({"url": video_url, "error": "URL YouTube invalide"})
+        elif video_id not in seen:
+            seen.add(video_id)
+            if video_id in infos:
+                videos.append({"video_id": video_id, **infos[video_id]})
+            else:
+                videos.append({"video_id": video_id, "error": "Vidéo non trouvée"})
+    return videos
+
+@app.before_request
+def track_llm_usage():
+    """ Démarre le relevé des tokens LLM de la requête """
+    g.llm_ledger = start_ledger()
+
+@app.after_request
+def report_llm_usage(response):
+    """ Expose la taille des appels LLM de la requête dans les en-têtes """
+    ledger = getattr(g, "llm_ledger", None)
+    if ledger:
+        usage = summarize_ledger(ledger)
+        response.headers["X-LLM-Calls"] = str(usage["calls"])
+        response.headers["X-LLM-Input-Tokens"] = str(usage["input_tokens"])
+        response.headers["X-LLM-Output-Tokens"] = str(usage["output_tokens"])
+        print(f"Tokens LLM {request.path} : {usage}")
+    return response
+
+@app.route("/llm_usage", methods=["GET"])
+def llm_usage():
+    """ Totaux des appels LLM depuis le démarrage du processus """
+    return jsonify(usage_totals())
+
+@app.route("/upstream_stats", methods=["GET"])
+def get_upstream_stats():
+    """ Appels sortants par service (tentatives, erreurs, limiteurs, disjoncteur) et requêtes Gemini doublées """
+    return jsonify({**upstream_stats(), "gemini_hedging": gemini_hedger.stats()})
+
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """ Statistiques des caches (transcriptions, réponses Gemini, analyses mutualisées) """
+    return jsonify(all_cache_stats())
+
+def all_cache_stats():
+    return {
+        "transcripts": transcript_cache.stats(),
+        "gemini": response_cache.stats(),
+        "analyses": analysis_flight.stats()
+    }
 
 if __name__ == "__main__":
+    prewarm()
     app.run(debug=True)
@@ -0,0 +1,188 @@
+import re
+from bisect import bisect_left
+import numpy as np
+
+from transcripts import Transcript
+
+WORD_RE = re.compile(r"\w+")
+
+# Taille des n-grammes indexés
+NGRAM_SIZE = 3
+# Nombre de fenêtres essayées au début et à la fin d'un chapitre avant d'abandonner
+ANCHOR_ATTEMPTS = 12
+# Écart toléré entre une ancre et sa position attendue, en fraction de la longueur du chapitre
+ALIGN_TOLERANCE = 0.25
+
+
+def normalize_words(text):
+    """ Mots en minuscules, sans ponctuation """
+    return WORD_RE.findall(text.lower())
+
+
+class TranscriptAligner:
+    """ Retrouve les chapitres dans la transcription grâce à un index de n-grammes de mots
+
+    Le texte est concaténé une seule fois ; des tableaux NumPy donnent le
+    décalage en caractères de chaque segment, son début et sa durée. Une
+    position dans le texte se convertit en temps par un searchsorted, avec
+    interpolation à l'intérieur du segment (précision inférieure au segment).
+
+    L'index de n-grammes est construit une seule fois ; chaque ancre de
+    chapitre se résout ensuite par quelques recherches dichotomiques. Les
+    chapitres sont alignés dans l'ordre, sans retour en arrière, chaque
+    ancre dans une fenêtre autour de sa position attendue.
+    """
+
+    def __init__(self, transcript, n=NGRAM_SIZE):
+        self.n = n
+        transcript = Transcript.from_entries(transcript)
+        # Segments séparés par un caractère : mêmes décalages que le buffer de la Transcript
+        self.text = transcript.join(Transcript.SEPARATOR)
+
+        self.segment_lengths = transcript.text_lengths()
+        self.segment_offsets = np.concatenate(([0], np.cumsum(self.segment_lengths + 1)[:-1]))
+        self.starts = transcript.start_array()
+        self.durations = transcript.duration_array()
+
+        # Mots du texte concaténé et leurs bornes en caractères
+        lowered = self.text.lower()
+        if len(lowered) != len(self.text):
+            # Rares caractères dont la minuscule change de longueur : les décalages ne correspondraient plus
+            lowered = self.text
+        matches = list(WORD_RE.finditer(lowered))
+        words = [match.group() for match in matches]
+        if lowered is self.text:
+            words = [word.lower() for word in words]
+        spans = np.array([match.span() for match in matches], dtype=np.int64).reshape(-1, 2)
+        self.word_starts = spans[:, 0]
+        self.word_ends = spans[:, 1]
+
+        self.index = {}
+        ngrams = zip(*(words[i:] for i in range(n)))
+        for position, ngram in enumerate(ngrams):
+            self.index.setdefault(ngram, []).append(position)
+
+    def _positions(self, ngram):
+        return self.index.get(tuple(ngram), ())
+
+    def _nearest(self, ngram, target, low, high):
+        """ Occurrence de ngram la plus proche de target, comprise entre low et high, ou None """
+        positions = self._positions(ngram)
+        i = bisect_left(positions, target)
+        candidates = [p for p in positions[max(0, i - 1):i + 1] if low <= p <= high]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda p: abs(p - target))
+
+    def _find_first(self, words, expected, low, high):
+        """ Début du chapitre (position du premier mot) le plus proche de expected, entre low et high """
+        for offset in range(min(ANCHOR_ATTEMPTS, len(words) - self.n + 1)):
+            position = self._nearest(words[offset:offset + self.n], expected + offset, low + offset, high + offset)
+            if position is not None:
+                return position - offset
+        return None
+
+    def _find_last(self, words, expected_end, low, high):
+        """ Fin du chapitre (position du dernier mot) la plus proche de expected_end, entre low et high """
+        last = len(words) - self.n
+        for offset in range(last, max(-1, last - ANCHOR_ATTEMPTS), -1):
+            tail = len(words) - 1 - offset
+            position = self._nearest(words[offset:offset + self.n], expected_end - tail, low - tail, high - tail)
+            if position is not None:
+                return min(position + tail, len(self.word_starts) - 1)
+        return None
+
+    def align(self, scripts):
+        """ Retourne, pour chaque script de chapitre, (premier mot, dernier mot) ou None
+
+        Chaque ancre est cherchée dans une fenêtre autour de sa position
+        attendue (fin du chapitre précédent, puis début + longueur du
+        script) : une occurrence lointaine du même n-gramme, fréquente quand
+        la copie du script est approximative, compte comme introuvable au
+        lieu de décaler tous les chapitres suivants.
+        """
+        anchors = []
+        floor = 0      # Aucun chapitre ne commence avant la fin confirmée du précédent
+        expected = 0   # Position attendue du premier mot du chapitre
+        for script in scripts:
+            words = normalize_words(script or "")
+            if len(words) < self.n:
+                anchors.append((None, None))
+                continue
+
+            tolerance = max(self.n, int(len(words) * ALIGN_TOLERANCE))
+            start = self._find_first(words, expected, max(floor, expected - tolerance), expected + tolerance)
+            expected_end = (start if start is not None else expected) + len(words) - 1
+            end = self._find_last(words, expected_end, max(floor, start or 0, expected_end - tolerance),
+                                  expected_end + tolerance)
+
+            if end is not None:
+                floor = expected = end + 1
+            else:
+                # Fin introuvable : on avance d'après la longueur du script, sans la confirmer
+                expected = expected_end + 1
+                if start is not None:
+                    floor = start + 1
+            anchors.append((start, end))
+        return anchors
+
+    def offsets_to_times(self, offsets):
+        """ Convertit des positions en caractères en secondes (vectorisé) """
+        offsets = np.asarray(offsets, dtype=np.int64)
+        segments = np.searchsorted(self.segment_offsets, offsets, side="right") - 1
+        within = offsets - self.segment_offsets[segments]
+        fraction = np.clip(within / np.maximum(self.segment_lengths[segments], 1), 0.0, 1.0)
+        return self.starts[segments] + self.durations[segments] * fraction
+
+    def chapter_times(self, scripts):
+        """ Début et fin (secondes) de chaque chapitre ; NaN quand l'ancre est introuvable """
+        anchors = self.align(scripts)
+        start_words = np.array([start if start is not None else -1 for start, _ in anchors], dtype=np.int64)
+        end_words = np.array([end if end is not None else -1 for _, end in anchors], dtype=np.int64)
+
+        starts = np.full(len(anchors), np.nan)
+        ends = np.full(len(anchors), np.nan)
+        if len(self.word_starts):
+            found = start_words >= 0
+            starts[found] = self.offsets_to_times(self.word_starts[start_words[found]])
+            found = end_words >= 0
+            ends[found] = self.offsets_to_times(self.word_ends[end_words[found]])
+        return starts, ends
+
+
+def line_range(chapter, line_count):
+    """ (première ligne, dernière ligne) d'un chapitre segmenté par numéros de ligne, ou None """
+    try:
+        start_line = int(chapter["start_line"])
+        end_line = int(chapter["end_line"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if not 0 <= start_line <= end_line < line_count:
+        return None
+    return start_line, end_line
+
+
+def chapter_times(chapters, transcript):
+    """ Début et fin (secondes) de chaque chapitre ; NaN quand ils sont introuvables
+
+    Les chapitres renvoyés avec start_line/end_line sont résolus par simple
+    lecture des tableaux ; les autres par l'index de n-grammes sur "script".
+    """
+    ranges = [line_range(chapter, len(transcript)) for chapter in chapters]
+    starts = np.full(len(chapters), np.nan)
+    ends = np.full(len(chapters), np.nan)
+
+    if any(line_span is None for line_span in ranges):
+        aligner = TranscriptAligner(transcript)
+        starts, ends = aligner.chapter_times([chapter.get("script", "") for chapter in chapters])
+
+    with_lines = np.array([line_span is not None for line_span in ranges], dtype=bool)
+    if with_lines.any():
+        transcript = Transcript.from_entries(transcript)
+        line_starts = transcript.start_array()
+        line_ends = line_starts + transcript.duration_array()
+        first = np.array([line_span[0] for line_span in ranges if line_span is not None], dtype=np.int64)
+        last = np.array([line_span[1] for line_span in ranges if line_span is not None], dtype=np.int64)
+        starts[with_lines] = line_starts[first]
+        ends[with_lines] = line_ends[last]
+    return starts, ends
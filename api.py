@@ -1,30 +1,50 @@
-from flask import Flask, request, jsonify
-from youtube_transcript_api import YouTubeTranscriptApi
-import googleapiclient.discovery
+from flask import Flask, g, request, jsonify
 import os
 import json
+import math
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-import google.generativeai as genai
+from transcripts import fetch_transcript, join_text, transcript_cache
+from aligner import chapter_times, line_range
+from youtube_client import get_youtube_client, execute
+from prewarm import prewarm
+from llm import generate_text, response_cache
+from mapreduce import needs_map_reduce, summarize_map_reduce, segment_map_reduce
+from stages import submit_with_context
+from token_budget import start_ledger, summarize_ledger, usage_totals
+from timefmt import TIME_FORMATS, DEFAULT_TIME_FORMAT, format_chapters
+from video_ids import parse_video_id
+from singleflight import SingleFlight
+from hedging import gemini_hedger
+from outbound import is_transient, upstream_stats
 
 # Charger les variables d'environnement
 load_dotenv()
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-# Configurer l'API Gemini
-genai.configure(api_key=GEMINI_API_KEY)
+# L'API Gemini est configurée au premier appel (llm.get_model), ou au démarrage par prewarm()
 
 app = Flask(__name__)
 
+# "lines" : la transcription est numérotée et Gemini ne renvoie que les numéros de ligne de chaque chapitre
+# "script" : Gemini recopie le texte de chaque chapitre, retrouvé ensuite dans la transcription
+SEGMENTATION_MODE = os.getenv("SEGMENTATION_MODE", "lines")
+
+# "inline" : résumés des chapitres demandés dans la réponse de segmentation (2 appels LLM au total)
+# "parallel" : un appel Gemini par chapitre
+CHAPTER_SUMMARY_MODE = os.getenv("CHAPTER_SUMMARY_MODE", "inline")
+
+# Nombre maximal de résumés de chapitres envoyés simultanément à Gemini, par requête
+CHAPTER_SUMMARY_CONCURRENCY = int(os.getenv("CHAPTER_SUMMARY_CONCURRENCY", "4"))
+summary_flight = SingleFlight("video_summaries")
+
 def get_youtube_video_info(video_id):
     """ Récupère les informations d'une vidéo YouTube """
-    youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
+    youtube = get_youtube_client()
     
     request = youtube.videos().list(
         part="snippet,statistics,contentDetails",
         id=video_id
     )
-    response = request.execute()
+    response = execute(request)
 
     if not response["items"]:
         return None
@@ -40,162 +60,287 @@ def get_youtube_video_info(video_id):
     }
     return info
 
-def get_video_transcription(video_id):
-    """Récupère la transcription en français ou en anglais si indisponible"""
+def get_video_transcription(video_id, failed_stages=None):
+    """Récupère la transcription en français ou en anglais si indisponible
+
+    Un échec passager (quota, disjoncteur, erreur réseau) est noté dans
+    failed_stages ; une vidéo sans sous-titres ne l'est pas.
+    """
     try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['fr', 'en'])
+        transcript = fetch_transcript(video_id)
         return transcript
     except Exception as e:
         print(f"Erreur : {e}")
+        if failed_stages is not None and is_transient(e):
+            failed_stages.append("transcription")
         return None
 
-def format_timestamp(seconds):
-    """ Convertit un timestamp en hh:mm:ss """
-    hours, remainder = divmod(int(seconds), 3600)
-    minutes, seconds = divmod(remainder, 60)
-    return f"{hours:02}:{minutes:02}:{seconds:02}"
+def missing_transcription(failed_stages):
+    """ Réponse sans transcription : 503 (à retenter) après un échec passager, 404 sinon """
+    if failed_stages:
+        return {"error": "Service YouTube momentanément indisponible"}, 503
+    return {"error": "Transcription non disponible"}, 404
 
-def hhmmss_to_seconds(timestamp):
-    """ Convertit un timestamp hh:mm:ss en secondes """
-    h, m, s = map(int, timestamp.split(":"))
-    return h * 3600 + m * 60 + s
+def build_summary_prompt(transcription):
+    """ Construit le prompt de résumé """
+    full_text = join_text(transcription, " ")
+    return f"""
+    Résume cette transcription de manière claire et concise et assure toi que tu me rende le resuméé en français :
+    
+    {full_text}
 
-def get_transcript_with_timestamps(video_id):
-    """ Récupère la transcription avec timestamps """
-    try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['fr', 'en'])
-        return [
-            {
-                "sentence": entry["text"],
-                "start_time": format_timestamp(entry["start"]),
-                "end_time": format_timestamp(entry["start"] + entry["duration"])
-            }
-            for entry in transcript
-        ]
-    except Exception:
-        return None
+    Résumé :
+    """
+
+SUMMARY_ERROR = "Erreur lors de la génération du résumé."
 
 def generate_summary(transcription):
     """ Génère un résumé avec Gemini """
     if not transcription:
         return "Résumé non disponible."
 
-    full_text = " ".join([entry["text"] for entry in transcription])
-    prompt = f"""
-    Résume cette transcription de manière claire et concise et assure toi que tu me rende le resuméé en français :
-    
-    {full_text}
-
-    Résumé :
-    """
-    
     try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        return response.text.strip() if response and hasattr(response, 'text') else "Résumé non disponible."
+        # Transcriptions très longues : résumés partiels en parallèle puis fusion
+        if needs_map_reduce(transcription):
+            summary = summarize_map_reduce(transcription, build_summary_prompt)
+        else:
+            summary = generate_text(build_summary_prompt(transcription), hedge=True)
+        return summary or "Résumé non disponible."
     except Exception:
-        return "Erreur lors de la génération du résumé."
+        return SUMMARY_ERROR
 
-def segment_transcription_by_topics(transcription):
-    """ Segmente la transcription en chapitres thématiques """
+def segment_transcription_by_topics(transcription, with_summaries=False):
+    """ Segmente la transcription en chapitres thématiques
+
+    Avec with_summaries, chaque chapitre contient aussi son résumé court
+    ("summary"), ce qui évite un appel Gemini par chapitre.
+    """
     if not transcription:
         return None
+    if needs_map_reduce(transcription):
+        return segment_map_reduce(
+            transcription,
+            lambda chunk: segment_transcription_by_topics(chunk, with_summaries=with_summaries)
+        )
 
-    full_text = "\n".join(entry["text"] for entry in transcription)
-    prompt = f"""
+    try:
+        text = generate_text(build_segmentation_prompt(transcription, with_summaries), hedge=True)
+        return parse_chapters(text)
+    except Exception:
+        return None
+
+def build_segmentation_prompt(transcription, with_summaries=False):
+    """ Construit le prompt de segmentation (numéros de ligne ou texte recopié selon SEGMENTATION_MODE) """
+    summary_field = ', "summary": "Résumé court du chapitre en français"' if with_summaries else ""
+    if SEGMENTATION_MODE == "lines":
+        numbered_text = "\n".join(f"[{i}] {entry['text']}" for i, entry in enumerate(transcription))
+        return f"""
+    Segmente ce texte en chapitres basés sur les sujets abordés.
+    Chaque ligne de la transcription commence par son numéro entre crochets.
+    Retourne une liste de chapitres au format JSON, sans recopier la transcription :
+    [
+      {{"title": "Nom du chapitre", "content": "Description courte du chapitre", "start_line": 0, "end_line": 41{summary_field}}}
+    ]
+    Les chapitres se suivent : le start_line d'un chapitre est le end_line du précédent + 1.
+    Transcription :
+    {numbered_text}
+    Assure-toi que la réponse soit bien formatée en JSON.
+    """
+    else:
+        full_text = join_text(transcription, "\n")
+        return f"""
     Segmente ce texte en chapitres basés sur les sujets abordés.
     Retourne une liste de chapitres au format JSON :
     [
-      {{"title": "Nom du chapitre", "content": "Texte du chapitre", "script": "Texte du segment"}}
+      {{"title": "Nom du chapitre", "content": "Texte du chapitre", "script": "Texte du segment"{summary_field}}}
     ]
     Transcription :
     {full_text}
     Assure-toi que la réponse soit bien formatée en JSON.
     """
-    
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt)
-        return json.loads(response.text.strip().replace("```json", "").replace("```", "").strip())
-    except Exception:
-        return None
+
+def parse_chapters(text):
+    """ Chapitres JSON renvoyés par Gemini, sans les balises ```json """
+    return json.loads(text.replace("```json", "").replace("```", "").strip())
 
 def assign_timestamps(chapters, transcript):
-    """ Associe chaque chapitre à un timestamp """
+    """ Associe à chaque chapitre son début et sa fin en secondes (transcription brute : text, start, duration) """
     if not chapters or not transcript:
         return None
 
+    # Numéros de ligne si la segmentation les fournit, sinon index de n-grammes sur le script
+    starts, ends = chapter_times(chapters, transcript)
+
     timestamped_chapters = []
-    previous_end_time = None
-    current_index = 0
+    previous_end = None
+
+    for chapter, start, end in zip(chapters, starts.tolist(), ends.tolist()):
+        # Sans ancre de début, le chapitre commence où le précédent s'arrête
+        if math.isnan(start):
+            start = previous_end if previous_end is not None else transcript[0]["start"]
+        # Les chapitres ne se chevauchent pas et le temps ne recule jamais
+        if previous_end is not None:
+            start = max(start, previous_end)
+        end = None if math.isnan(end) else max(end, start)
 
-    for chapter in chapters:
-        script_words = chapter["script"].split()
-        last_10_words = " ".join(script_words[-15:])
-        
-        start_time = previous_end_time or transcript[0]["start_time"]
-        end_time = None
-
-        for i in range(current_index, len(transcript)):
-            entry = transcript[i]
-            if entry["sentence"] in last_10_words:
-                end_time = entry["end_time"]
-                current_index = i
-                break
-        
         timestamped_chapters.append({
             "title": chapter["title"],
             "content": chapter["content"],
-            "start_time": start_time,
-            "end_time": end_time or start_time
+            # Secondes : le format d'affichage est choisi par le client, à la sérialisation
+            "start_time": start,
+            "end_time": end if end is not None else start
         })
         
-        previous_end_time = end_time or previous_end_time
+        previous_end = end if end is not None else start
 
     return timestamped_chapters
 
-@app.route("/video_summary", methods=["GET"])
-def video_summary():
-    """ API pour récupérer le résumé et les chapitres d'une vidéo YouTube """
-    video_url = request.args.get("url")  # Lien statique par défaut
-    if not video_url:
-        return jsonify({"error": "Aucune URL fournie"}), 400
+def chapter_text(chapter, transcription):
+    """ Texte d'un chapitre : ses lignes de transcription s'il est segmenté par numéros de ligne, sinon son script """
+    lines = line_range(chapter, len(transcription))
+    if lines is not None:
+        return join_text(transcription[lines[0]:lines[1] + 1])
+    return chapter.get("script") or chapter["content"]
 
-    video_id = video_url.split("v=")[-1]
-    
+def summarize_chapter(chapter, transcription):
+    """ Résume un chapitre ; en cas d'échec on garde le texte du chapitre """
+    text = chapter_text(chapter, transcription)
+    try:
+        return generate_text(build_summary_prompt([{"text": text}])) or text
+    except Exception as e:
+        print(f"Erreur résumé du chapitre '{chapter['title']}' : {e}")
+        return text
+
+def summarize_chapters(chapters, transcription):
+    """ Résume les chapitres en parallèle, dans l'ordre des chapitres
+
+    Chaque requête a son propre pool : une vidéo à nombreux chapitres ne fait
+    pas attendre les résumés des autres requêtes.
+    """
+    if not chapters:
+        return []
+    workers = min(CHAPTER_SUMMARY_CONCURRENCY, len(chapters))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chapter") as executor:
+        futures = [submit_with_context(executor, summarize_chapter, chapter, transcription) for chapter in chapters]
+        return [future.result() for future in futures]
+
+def resolve_chapter_summaries(chapters, transcription):
+    """ Utilise les résumés renvoyés par la segmentation et ne résume que les chapitres sans résumé """
+    missing = [chapter for chapter in chapters if not chapter.get("summary")]
+    generated = iter(summarize_chapters(missing, transcription))
+    return [chapter.get("summary") or next(generated) for chapter in chapters]
+
+def build_video_summary(video_id):
+    """ Résumé et chapitres (temps en secondes) d'une vidéo. Retourne (réponse, code HTTP) """
     # Récupération de la transcription de la vidéo
-    transcription = get_video_transcription(video_id)
+    failed_stages = []
+    transcription = get_video_transcription(video_id, failed_stages)
     
     if not transcription:
-        return jsonify({"error": "Transcription non disponible"}), 404
+        return missing_transcription(failed_stages)
     
     # Génération du résumé complet de la vidéo
     summary = generate_summary(transcription)
     
     # Récupération des chapitres thématiques
-    chapters = segment_transcription_by_topics(transcription)
-    timestamped_chapters = assign_timestamps(chapters, get_transcript_with_timestamps(video_id))
+    inline_summaries = CHAPTER_SUMMARY_MODE == "inline"
+    chapters = segment_transcription_by_topics(transcription, with_summaries=inline_summaries)
+    timestamped_chapters = assign_timestamps(chapters, transcription)
+
+    # Résumés des chapitres : fournis par la segmentation, sinon lancés en parallèle
+    chapter_summaries = resolve_chapter_summaries(chapters or [], transcription) if timestamped_chapters else []
+
+    response = video_summary_response(summary, timestamped_chapters, chapter_summaries)
+
+    # Affichage de la réponse dans le terminal
+    print('on attend')
+    print(json.dumps(response, indent=2))
+
+    return response, 200
+
+def is_shareable_summary(result):
+    """ Seuls les résumés définitifs sont publiés aux autres workers : pas d'erreur 5xx ni de résumé en échec """
+    response, status_code = result
+    return status_code < 500 and response.get("summary") != SUMMARY_ERROR
 
-    # Formatage de la réponse
-    response = {
+def video_summary_response(summary, timestamped_chapters, chapter_summaries):
+    """ Formatage de la réponse (temps des chapitres en secondes) """
+    return {
         "summary": summary,
         "chapters": [
             {
                 "title": chapter["title"],
                 "start_time": chapter["start_time"],
                 "end_time": chapter["end_time"],
-                "chapter_summary": generate_summary([{"text": chapter["content"]}])  # Résumé du chapitre
+                "chapter_summary": chapter_summary  # Résumé du chapitre
             }
-            for chapter in timestamped_chapters
+            for chapter, chapter_summary in zip(timestamped_chapters, chapter_summaries)
         ] if timestamped_chapters else []
     }
 
-    # Affichage de la réponse dans le terminal
-    print('on attend')
-    print(json.dumps(response, indent=2))
+@app.route("/video_summary", methods=["GET"])
+def video_summary():
+    """ API pour récupérer le résumé et les chapitres d'une vidéo YouTube
+
+    time_format=hms (par défaut), seconds ou iso : format des temps des chapitres
+    """
+    video_url = request.args.get("url")  # Lien statique par défaut
+    if not video_url:
+        return jsonify({"error": "Aucune URL fournie"}), 400
+    time_format = request.args.get("time_format", DEFAULT_TIME_FORMAT)
+    if time_format not in TIME_FORMATS:
+        return jsonify({"error": f"time_format doit valoir {', '.join(TIME_FORMATS)}"}), 400
+
+    video_id = parse_video_id(video_url)
+    if not video_id:
+        return jsonify({"error": "URL YouTube invalide"}), 400
+
+    # Requêtes simultanées pour la même vidéo : un seul calcul, partagé entre requêtes et workers
+    response, status_code = summary_flight.do(
+        video_id, lambda: build_video_summary(video_id), shareable=is_shareable_summary
+    )
+    if status_code == 200:
+        response = {**response, "chapters": format_chapters(response["chapters"], time_format)}
 
     # Retourner la réponse JSON
-    return jsonify(response)
+    return jsonify(response), status_code
+
+@app.before_request
+def track_llm_usage():
+    """ Démarre le relevé des tokens LLM de la requête """
+    g.llm_ledger = start_ledger()
+
+@app.after_request
+def report_llm_usage(response):
+    """ Expose la taille des appels LLM de la requête dans les en-têtes """
+    ledger = getattr(g, "llm_ledger", None)
+    if ledger:
+        usage = summarize_ledger(ledger)
+        response.headers["X-LLM-Calls"] = str(usage["calls"])
+        response.headers["X-LLM-Input-Tokens"] = str(usage["input_tokens"])
+        response.headers["X-LLM-Output-Tokens"] = str(usage["output_tokens"])
+        print(f"Tokens LLM {request.path} : {usage}")
+    return response
+
+@app.route("/llm_usage", methods=["GET"])
+def llm_usage():
+    """ Totaux des appels LLM depuis le démarrage du processus """
+    return jsonify(usage_totals())
+
+@app.route("/upstream_stats", methods=["GET"])
+def get_upstream_stats():
+    """ Appels sortants par service (tentatives, erreurs, limiteurs, disjoncteur) et requêtes Gemini doublées """
+    return jsonify({**upstream_stats(), "gemini_hedging": gemini_hedger.stats()})
+
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    """ Statistiques des caches (transcriptions, réponses Gemini, résumés mutualisés) """
+    return jsonify({
+        "transcripts": transcript_cache.stats(),
+        "gemini": response_cache.stats(),
+        "video_summaries": summary_flight.stats()
+    })
 
 if __name__ == "__main__":
+    prewarm()
     app.run(debug=True)
@@ -0,0 +1,393 @@
+""" Mode de service ASGI (Starlette) : mêmes routes et mêmes réponses que SaaSlogic.py et /video_summary d'api.py
+
+Les appels Gemini sont attendus via generate_content_async. L'API YouTube
+Data et youtube_transcript_api n'ont pas de client asynchrone : ils passent
+par asyncio.to_thread, sans bloquer la boucle, comme les lectures et
+écritures des caches SQLite (réponses Gemini, résultats mutualisés) et le
+comptage précis des tokens. Les étapes indépendantes du pipeline sont
+composées avec asyncio.gather, et un processus tient des centaines
+d'analyses en cours.
+
+Lancer : uvicorn asgi:app --workers 4
+"""
+import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+import SaaSlogic as logic
+import api as summary_api
+from llm import agenerate_text, astream_text
+from mapreduce import needs_map_reduce, map_summaries, build_reduce_prompt
+from stages import stage_result
+from token_budget import start_ledger, summarize_ledger, usage_totals
+from outbound import UpstreamUnavailable, upstream_stats
+from hedging import gemini_hedger
+from timefmt import TIME_FORMATS, DEFAULT_TIME_FORMAT, format_chapters
+from video_ids import parse_video_id
+from prewarm import prewarm
+
+# Threads pour les appels sans client asynchrone (YouTube Data, transcriptions) : ils attendent
+# le réseau, le pool par défaut d'asyncio (nombre de CPU + 4) serait le goulot d'étranglement
+ASGI_THREAD_WORKERS = int(os.getenv("ASGI_THREAD_WORKERS", "64"))
+# Résumés de chapitres envoyés simultanément à Gemini, par requête
+CHAPTER_SUMMARY_CONCURRENCY = int(os.getenv("CHAPTER_SUMMARY_CONCURRENCY", "4"))
+
+STREAM_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def error_response(message, status_code):
+    return JSONResponse({"error": message}, status_code=status_code)
+
+
+def video_params(request):
+    """ (video_id, time_format, réponse d'erreur) à partir de ?url=...&time_format=... """
+    video_url = request.query_params.get("url")
+    if not video_url:
+        return None, None, error_response("Aucune URL fournie", 400)
+    time_format = request.query_params.get("time_format", DEFAULT_TIME_FORMAT)
+    if time_format not in TIME_FORMATS:
+        return None, None, error_response(f"time_format doit valoir {', '.join(TIME_FORMATS)}", 400)
+    video_id = parse_video_id(video_url)
+    if not video_id:
+        return None, None, error_response("URL YouTube invalide", 400)
+    return video_id, time_format, None
+
+
+# ---------- Étapes du pipeline ----------
+
+async def generate_summary(transcription, build_prompt=logic.build_summary_prompt):
+    """ Variante asyncio de generate_summary """
+    if not transcription:
+        return "Résumé non disponible."
+
+    try:
+        if needs_map_reduce(transcription):
+            # Les résumés partiels tournent sur le pool dédié ; seule la fusion est attendue ici
+            summaries = await asyncio.to_thread(map_summaries, transcription, build_prompt)
+            summary = await agenerate_text(build_reduce_prompt(summaries), hedge=True)
+        else:
+            summary = await agenerate_text(build_prompt(transcription), hedge=True)
+        return summary or "Résumé non disponible."
+    except Exception:
+        return logic.SUMMARY_ERROR
+
+
+async def segment_transcription_by_topics(transcription, app_module=logic, **options):
+    """ Variante asyncio de segment_transcription_by_topics (prompt de SaaSlogic ou d'api selon app_module) """
+    if not transcription:
+        return None
+    if needs_map_reduce(transcription):
+        return await asyncio.to_thread(app_module.segment_transcription_by_topics, transcription, **options)
+
+    try:
+        text = await agenerate_text(app_module.build_segmentation_prompt(transcription, **options), hedge=True)
+        return app_module.parse_chapters(text)
+    except Exception:
+        return None
+
+
+async def timestamped_chapters(transcription):
+    chapters = await segment_transcription_by_topics(transcription)
+    # Alignement sur la transcription : calcul NumPy, hors de la boucle
+    chapters = await asyncio.to_thread(logic.assign_timestamps, chapters, transcription)
+    return chapters or "Chapitres non disponibles."
+
+
+async def iter_video_analysis(video_id, failed_stages=None):
+    """ Variante asyncio de SaaSlogic.iter_video_analysis : mêmes parties, dans le même ordre """
+    failed_stages = failed_stages if failed_stages is not None else []
+    info_task = asyncio.ensure_future(asyncio.to_thread(logic.get_youtube_video_info, video_id))
+    transcription_task = asyncio.ensure_future(
+        asyncio.to_thread(logic.get_video_transcription, video_id, failed_stages)
+    )
+
+    try:
+        video_info = await info_task
+    except UpstreamUnavailable as e:
+        print(f"Erreur : {e}")
+        yield "error", {"error": "Service YouTube momentanément indisponible", "status": 503}
+        return
+    except Exception as e:
+        print(f"Erreur : {e}")
+        yield "error", {"error": "Erreur lors de la récupération des informations", "status": 502}
+        return
+    if not video_info:
+        yield "error", {"error": "Vidéo non trouvée", "status": 404}
+        return
+    yield "metadata", video_info
+
+    transcription = await transcription_task
+    yield "transcription", transcription.to_list() if transcription else "Transcription non disponible."
+
+    summary_task = asyncio.ensure_future(generate_summary(transcription))
+    chapters_task = asyncio.ensure_future(timestamped_chapters(transcription))
+    pending = {summary_task, chapters_task}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task is summary_task:
+                summary = stage_result(task, logic.SUMMARY_ERROR, "résumé")
+                if summary == logic.SUMMARY_ERROR:
+                    failed_stages.append("résumé")
+                yield "summary", summary
+            else:
+                chapters = stage_result(task, "Chapitres non disponibles.", "chapitres")
+                if transcription and not isinstance(chapters, list):
+                    failed_stages.append("chapitres")
+                yield "chapters", chapters
+
+
+async def analyze_video(video_id, failed_stages=None):
+    """ Variante asyncio de SaaSlogic.analyze_video. Retourne (réponse, code HTTP) """
+    video_info = {}
+    async for part, data in iter_video_analysis(video_id, failed_stages):
+        if part == "error":
+            return {"error": data["error"]}, data["status"]
+        if part == "metadata":
+            video_info.update(data)
+        else:
+            video_info[part] = data
+    return video_info, 200
+
+
+async def analyze_video_shared(video_id):
+    """ Requêtes simultanées pour la même vidéo : un seul pipeline (même mutualisation que SaaSlogic)
+
+    Retourne (réponse, code HTTP, étapes en échec).
+    """
+    async def analyze():
+        failed_stages = []
+        video_info, status_code = await analyze_video(video_id, failed_stages)
+        return video_info, status_code, failed_stages
+
+    return await logic.analysis_flight.ado(video_id, analyze, shareable=logic.is_complete_analysis)
+
+
+async def summarize_chapter(chapter, transcription, semaphore):
+    """ Variante asyncio de api.summarize_chapter """
+    text = summary_api.chapter_text(chapter, transcription)
+    async with semaphore:
+        try:
+            prompt = summary_api.build_summary_prompt([{"text": text}])
+            return await agenerate_text(prompt) or text
+        except Exception as e:
+            print(f"Erreur résumé du chapitre '{chapter['title']}' : {e}")
+            return text
+
+
+async def resolve_chapter_summaries(chapters, transcription):
+    """ Variante asyncio de api.resolve_chapter_summaries """
+    semaphore = asyncio.Semaphore(CHAPTER_SUMMARY_CONCURRENCY)
+    missing = [chapter for chapter in chapters if not chapter.get("summary")]
+    generated = iter(await asyncio.gather(*(summarize_chapter(chapter, transcription, semaphore) for chapter in missing)))
+    return [chapter.get("summary") or next(generated) for chapter in chapters]
+
+
+async def build_video_summary(video_id):
+    """ Variante asyncio de api.build_video_summary : résumé et segmentation en parallèle """
+    failed_stages = []
+    transcription = await asyncio.to_thread(summary_api.get_video_transcription, video_id, failed_stages)
+    if not transcription:
+        return summary_api.missing_transcription(failed_stages)
+
+    inline_summaries = summary_api.CHAPTER_SUMMARY_MODE == "inline"
+    summary, chapters = await asyncio.gather(
+        generate_summary(transcription, summary_api.build_summary_prompt),
+        segment_transcription_by_topics(transcription, summary_api, with_summaries=inline_summaries),
+    )
+    timestamped = await asyncio.to_thread(summary_api.assign_timestamps, chapters, transcription)
+    chapter_summaries = await resolve_chapter_summaries(chapters or [], transcription) if timestamped else []
+    return summary_api.video_summary_response(summary, timestamped, chapter_summaries), 200
+
+
+# ---------- Routes ----------
+
+async def get_video_info(request):
+    """ API pour récupérer les infos, résumé et chapitres d'une vidéo """
+    video_id, time_format, error = video_params(request)
+    if error:
+        return error
+    video_info, status_code, _ = await analyze_video_shared(video_id)
+    return JSONResponse(logic.format_analysis(video_info, time_format), status_code=status_code)
+
+
+async def stream_video_info(request):
+    """ Variante progressive de /video_info (format=ndjson ou sse) """
+    video_id, time_format, error = video_params(request)
+    if error:
+        return error
+    use_sse = request.query_params.get("format", "ndjson") == "sse"
+
+    async def generate():
+        async for part, data in iter_video_analysis(video_id):
+            if part == "chapters":
+                data = format_chapters(data, time_format)
+            if use_sse:
+                yield f"event: {part}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+            else:
+                yield json.dumps({"event": part, "data": data}, ensure_ascii=False) + "\n"
+        if use_sse:
+            yield "event: done\ndata: {}\n\n"
+        else:
+            yield json.dumps({"event": "done", "data": {}}) + "\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream" if use_sse else "application/x-ndjson",
+        headers=STREAM_HEADERS
+    )
+
+
+async def stream_summary(request):
+    """ Résumé IA envoyé en texte brut au fil de la génération """
+    video_id, _, error = video_params(request)
+    if error:
+        return error
+    transcription = await asyncio.to_thread(logic.get_video_transcription, video_id)
+
+    async def generate():
+        if not transcription:
+            yield "Résumé non disponible."
+            return
+        try:
+            if needs_map_reduce(transcription):
+                summaries = await asyncio.to_thread(map_summaries, transcription, logic.build_summary_prompt)
+                prompt = build_reduce_prompt(summaries)
+            else:
+                prompt = logic.build_summary_prompt(transcription)
+            async for chunk in astream_text(prompt):
+                yield chunk
+        except Exception:
+            yield "Erreur lors de la génération du résumé."
+
+    return StreamingResponse(generate(), media_type="text/plain; charset=utf-8", headers=STREAM_HEADERS)
+
+
+async def get_video_info_batch(request):
+    """ API pour récupérer les métadonnées de plusieurs vidéos (sans résumé ni chapitres) """
+    if request.method == "POST":
+        try:
+            payload = await request.json()
+        except ValueError:
+            payload = None
+        payload = payload if isinstance(payload, dict) else {}
+        video_urls = payload.get("urls") or payload.get("ids") or []
+    else:
+        video_urls = request.query_params.getlist("url") or request.query_params.getlist("id")
+
+    if not video_urls:
+        return error_response("Aucune URL fournie", 400)
+    if not logic.is_url_list(video_urls):
+        return error_response("urls doit être une liste de chaînes", 400)
+    if len(video_urls) > logic.MAX_BATCH_SIZE:
+        return error_response(f"Maximum {logic.MAX_BATCH_SIZE} vidéos par requête", 400)
+
+    videos = await asyncio.to_thread(logic.batch_video_infos, video_urls)
+    return JSONResponse({"videos": videos})
+
+
+async def create_job(request):
+    """ Lance l'analyse d'une vidéo en arrière-plan et retourne l'identifiant du job """
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = None
+    payload = payload if isinstance(payload, dict) else {}
+    video_url = payload.get("url") or request.query_params.get("url")
+    if not video_url:
+        return error_response("Aucune URL fournie", 400)
+
+    video_id = parse_video_id(video_url)
+    if not video_id:
+        return error_response("URL YouTube invalide", 400)
+    job_id = await asyncio.to_thread(logic.job_queue.enqueue, {"video_id": video_id})
+    return JSONResponse({"id": job_id, "status": "queued"}, status_code=202)
+
+
+async def get_job(request):
+    """ Retourne l'état d'un job et, une fois terminé, le résultat de l'analyse """
+    time_format = request.query_params.get("time_format", DEFAULT_TIME_FORMAT)
+    if time_format not in TIME_FORMATS:
+        return error_response(f"time_format doit valoir {', '.join(TIME_FORMATS)}", 400)
+    job = await asyncio.to_thread(logic.job_queue.get, request.path_params["job_id"])
+    if not job:
+        return error_response("Job introuvable", 404)
+    return JSONResponse(logic.job_status(job, time_format))
+
+
+async def video_summary(request):
+    """ API pour récupérer le résumé et les chapitres d'une vidéo YouTube """
+    video_id, time_format, error = video_params(request)
+    if error:
+        return error
+    response, status_code = await summary_api.summary_flight.ado(
+        video_id, lambda: build_video_summary(video_id), shareable=summary_api.is_shareable_summary
+    )
+    if status_code == 200:
+        response = {**response, "chapters": format_chapters(response["chapters"], time_format)}
+    return JSONResponse(response, status_code=status_code)
+
+
+async def llm_usage(request):
+    """ Totaux des appels LLM depuis le démarrage du processus """
+    return JSONResponse(usage_totals())
+
+
+async def cache_stats(request):
+    """ Statistiques des caches (transcriptions, réponses Gemini, calculs mutualisés) """
+    return JSONResponse({**logic.all_cache_stats(), "video_summaries": summary_api.summary_flight.stats()})
+
+
+async def get_upstream_stats(request):
+    """ Appels sortants par service et requêtes Gemini doublées """
+    return JSONResponse({**upstream_stats(), "gemini_hedging": gemini_hedger.stats()})
+
+
+class LLMUsageMiddleware(BaseHTTPMiddleware):
+    """ Relevé des tokens LLM de la requête, exposé dans les en-têtes (comme before/after_request) """
+
+    async def dispatch(self, request, call_next):
+        ledger = start_ledger()
+        response = await call_next(request)
+        if ledger:
+            usage = summarize_ledger(ledger)
+            response.headers["X-LLM-Calls"] = str(usage["calls"])
+            response.headers["X-LLM-Input-Tokens"] = str(usage["input_tokens"])
+            response.headers["X-LLM-Output-Tokens"] = str(usage["output_tokens"])
+            print(f"Tokens LLM {request.url.path} : {usage}")
+        return response
+
+
+@asynccontextmanager
+async def lifespan(app):
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=ASGI_THREAD_WORKERS, thread_name_prefix="asgi-io")
+    )
+    await asyncio.to_thread(prewarm)
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/video_info", get_video_info, methods=["GET"]),
+        Route("/video_info/stream", stream_video_info, methods=["GET"]),
+        Route("/summary/stream", stream_summary, methods=["GET"]),
+        Route("/video_info/batch", get_video_info_batch, methods=["GET", "POST"]),
+        Route("/jobs", create_job, methods=["POST"]),
+        Route("/jobs/{job_id}", get_job, methods=["GET"]),
+        Route("/video_summary", video_summary, methods=["GET"]),
+        Route("/llm_usage", llm_usage, methods=["GET"]),
+        Route("/cache_stats", cache_stats, methods=["GET"]),
+        Route("/upstream_stats", get_upstream_stats, methods=["GET"]),
+    ],
+    middleware=[Middleware(LLMUsageMiddleware)],
+    lifespan=lifespan,
+)
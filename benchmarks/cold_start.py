@@ -0,0 +1,142 @@
+""" Mesure du démarrage à froid des processus API
+
+Usage : python benchmarks/cold_start.py [--app SaaSlogic api asgi] [--path /llm_usage] [--runs 3]
+
+Pour chaque application, dans des processus neufs :
+- répartition du temps d'import par paquet (python -X importtime, temps propre cumulé)
+- lancement de l'interpréteur et import de l'application
+- durée de prewarm() (chargement différé de Gemini, YouTube, transcriptions)
+- temps jusqu'à la première réponse, sans puis avec pré-chauffage
+- sans pré-chauffage, coût du premier appel de chaque chargeur différé,
+  mesuré directement après la requête : c'est ce que paie la première
+  requête qui appelle Gemini, l'API YouTube ou les transcriptions
+
+--path choisit la requête mesurée ; la valeur par défaut (/llm_usage)
+n'appelle aucun service externe ni aucun chargeur différé, d'où la mesure
+séparée des chargeurs. Avec des clés d'API, --path "/video_info?url=..."
+mesure le coût complet de la première analyse.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Exécuté dans un processus neuf : imprime les durées mesurées en JSON
+CHILD = """
+import time, json, asyncio
+started = time.perf_counter()
+import {app} as module
+imported = time.perf_counter()
+prewarm_timings = None
+if {prewarm}:
+    from prewarm import prewarm
+    prewarm_timings = prewarm()
+warmed = time.perf_counter()
+
+path, _, query = {path!r}.partition("?")
+if hasattr(module.app, "test_client"):
+    status = module.app.test_client().get({path!r}).status_code
+else:
+    async def asgi_get():
+        statuses = []
+        scope = {{"type": "http", "asgi": {{"version": "3.0"}}, "http_version": "1.1", "method": "GET",
+                  "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+                  "headers": [], "client": ("127.0.0.1", 0), "server": ("127.0.0.1", 80), "root_path": ""}}
+        async def receive():
+            return {{"type": "http.request", "body": b"", "more_body": False}}
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+        await module.app(scope, receive, send)
+        return statuses[0]
+    status = asyncio.run(asgi_get())
+answered = time.perf_counter()
+
+# Sans pré-chauffage : premier appel de chaque chargeur différé (aucun appel réseau)
+lazy_loads = None
+if not {prewarm} and {path!r} == "/llm_usage":
+    from prewarm import prewarm
+    lazy_loads = prewarm()
+
+print(json.dumps({{
+    "import": imported - started,
+    "prewarm": warmed - imported,
+    "prewarm_steps": prewarm_timings,
+    "first_request": answered - warmed,
+    "status": status,
+    "lazy_loads": lazy_loads,
+}}))
+"""
+
+
+def run_child(app, path, prewarm):
+    """ Lance un processus neuf ; retourne les mesures et la durée totale (interpréteur compris) """
+    code = CHILD.format(app=app, path=path, prewarm=prewarm)
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    total = time.perf_counter() - started
+    measures = json.loads(result.stdout.strip().splitlines()[-1])
+    # Les chargeurs mesurés à part ne font pas partie du démarrage du processus
+    measures["process_total"] = total - sum((measures["lazy_loads"] or {}).values())
+    return measures
+
+
+def import_breakdown(app, top=12):
+    """ Temps d'import propre, cumulé par paquet racine (secondes) """
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", f"import {app}"],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    totals = defaultdict(int)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us)
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    return [(name, microseconds / 1e6) for name, microseconds in ranked[:top]]
+
+
+def median(runs, key):
+    return statistics.median(run[key] for run in runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", nargs="+", default=["SaaSlogic", "api", "asgi"])
+    parser.add_argument("--path", default="/llm_usage")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    for app in args.app:
+        print(f"=== {app} ===")
+        print("Import par paquet (temps propre) :")
+        for name, seconds in import_breakdown(app):
+            print(f"  {name:<28} {seconds * 1000:8.1f} ms")
+
+        cold = [run_child(app, args.path, prewarm=False) for _ in range(args.runs)]
+        warm = [run_child(app, args.path, prewarm=True) for _ in range(args.runs)]
+        print(f"Médianes sur {args.runs} processus, requête {args.path} (HTTP {cold[0]['status']}) :")
+        print(f"  import de l'application        {median(cold, 'import') * 1000:8.1f} ms")
+        print(f"  première requête sans prewarm  {median(cold, 'first_request') * 1000:8.1f} ms")
+        if cold[0]["lazy_loads"]:
+            lazy = statistics.median(sum(run["lazy_loads"].values()) for run in cold)
+            print(f"  + chargeurs différés au 1er appel {lazy * 1000:6.1f} ms  {cold[-1]['lazy_loads']}")
+        print(f"  processus complet sans prewarm {median(cold, 'process_total') * 1000:8.1f} ms")
+        print(f"  prewarm()                      {median(warm, 'prewarm') * 1000:8.1f} ms  {warm[-1]['prewarm_steps']}")
+        print(f"  première requête après prewarm {median(warm, 'first_request') * 1000:8.1f} ms")
+        print(f"  processus complet avec prewarm {median(warm, 'process_total') * 1000:8.1f} ms")
+        print()
+
+
+if __name__ == "__main__":
+    main()
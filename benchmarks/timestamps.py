@@ -0,0 +1,289 @@
+""" Comparaison hors ligne des implémentations d'assign_timestamps
+
+Usage : python benchmarks/timestamps.py [--sizes 100 1000 10000 50000] [--repeat 3]
+                                        [--noise 0.0] [--budget 20] [--only SaaSlogic malik ...]
+
+Chaque implémentation reçoit la même transcription synthétique (segments de
+durée aléatoire, vocabulaire à distribution de Zipf pour avoir des
+répétitions comme à l'oral) et les mêmes chapitres, dont les bornes réelles
+sont connues : "script" et "content" sont le texte exact des segments du
+chapitre, comme si Gemini l'avait recopié sans erreur. --noise remplace une
+fraction des mots des scripts pour simuler une recopie approximative.
+
+Mesures, pour chaque taille de transcription :
+- temps d'exécution (meilleur de --repeat) et débit en segments par seconde
+- pic mémoire alloué pendant l'appel (tracemalloc, exécution séparée)
+- erreur moyenne sur les bornes trouvées (secondes) et part des bornes trouvées
+
+Les scripts de tojrab/ appellent YouTube et Gemini à l'import : seules leurs
+fonctions d'horodatage (et leurs utilitaires format_timestamp,
+hhmmss_to_seconds) sont extraites par ast, puis exécutées isolément. La
+conversion de la transcription au format attendu (phrases "HH:MM:SS" ou
+Transcript) est préparée hors mesure, comme dans les pipelines d'origine.
+Une implémentation qui dépasse --budget secondes n'est pas relancée sur les
+tailles suivantes.
+"""
+import io
+import os
+import ast
+import sys
+import math
+import time
+import random
+import argparse
+import tracemalloc
+from contextlib import redirect_stdout
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from transcripts import Transcript
+
+# Utilitaires dont dépendent les fonctions extraites des scripts
+HELPERS = {"format_timestamp", "hhmmss_to_seconds"}
+
+
+def load_function(path, name):
+    """ Extrait name (et ses utilitaires) d'un script sans exécuter le reste du module """
+    with open(os.path.join(ROOT, path), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    nodes = [node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name in HELPERS | {name}]
+    namespace = {}
+    exec(compile(ast.Module(body=nodes, type_ignores=[]), path, "exec"), namespace)
+    return namespace[name]
+
+
+def load_app_function(module_name):
+    """ assign_timestamps des applications : leur import ne contacte aucun service """
+    module = __import__(module_name)
+    return module.assign_timestamps
+
+
+# Texte synthétique
+
+def make_vocabulary(rng, size=3000):
+    syllables = ["ba", "ko", "ri", "sa", "lu", "me", "to", "ni", "da", "vé", "pa", "zo", "ché", "lo", "mi", "ra"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(1, 4))))
+    return sorted(words)
+
+
+def make_transcript(size, rng, vocabulary):
+    """ size segments bruts {"text", "start", "duration"}, contigus à partir de 0 """
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    entries = []
+    start = 0.0
+    for _ in range(size):
+        text = " ".join(rng.choices(vocabulary, weights, k=rng.randint(4, 12)))
+        duration = round(rng.uniform(1.5, 6.0), 3)
+        entries.append({"text": text, "start": round(start, 3), "duration": duration})
+        start += duration + rng.choice([0.0, 0.0, 0.0, round(rng.uniform(0.1, 1.0), 3)])
+    return entries
+
+
+def make_chapters(entries, count, rng, vocabulary, noise=0.0):
+    """ count chapitres contigus ; retourne (chapitres, bornes réelles en secondes) """
+    count = max(1, min(count, len(entries)))
+    cuts = sorted(rng.sample(range(1, len(entries)), count - 1)) if count > 1 else []
+    bounds = list(zip([0] + cuts, cuts + [len(entries)]))
+
+    chapters = []
+    truth = []
+    for number, (first, stop) in enumerate(bounds, start=1):
+        script = " ".join(entry["text"] for entry in entries[first:stop])
+        if noise:
+            script = " ".join(rng.choice(vocabulary) if rng.random() < noise else word for word in script.split())
+        chapters.append({
+            "title": f"Chapitre {number}",
+            "content": script,
+            "script": script,
+            "start_line": first,
+            "end_line": stop - 1,
+        })
+        last = entries[stop - 1]
+        truth.append((entries[first]["start"], last["start"] + last["duration"]))
+    return chapters, truth
+
+
+def format_hhmmss(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+def sentences(entries):
+    """ Format de get_transcript_with_timestamps des scripts : phrases et bornes HH:MM:SS """
+    return [
+        {
+            "sentence": entry["text"],
+            "start_time": format_hhmmss(entry["start"]),
+            "end_time": format_hhmmss(entry["start"] + entry["duration"]),
+        }
+        for entry in entries
+    ]
+
+
+# Adaptateurs : même entrée, sortie normalisée en secondes
+
+def to_seconds(value):
+    """ Secondes d'une borne renvoyée (nombre, "MM:SS" ou "HH:MM:SS"), None si absente """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        seconds = 0
+        for part in value.split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+class Implementation:
+    """ Une implémentation et la façon de l'appeler
+
+    transcript_format : "raw" (segments bruts), "transcript" (Transcript) ou
+    "sentences" (phrases HH:MM:SS) ; transcript_first : ordre des arguments.
+    drop_fields retire les champs qui changeraient le chemin de code
+    (start_line/end_line pour les applications en mode script).
+    """
+
+    def __init__(self, name, loader, transcript_format, transcript_first=False, drop_fields=("start_line", "end_line")):
+        self.name = name
+        self.loader = loader
+        self.transcript_format = transcript_format
+        self.transcript_first = transcript_first
+        self.drop_fields = drop_fields
+        self._fn = None
+
+    @property
+    def fn(self):
+        if self._fn is None:
+            self._fn = self.loader()
+        return self._fn
+
+    def prepare(self, inputs, chapters):
+        transcript = inputs[self.transcript_format]
+        chapters = [{key: value for key, value in chapter.items() if key not in self.drop_fields} for chapter in chapters]
+        return (transcript, chapters) if self.transcript_first else (chapters, transcript)
+
+    def run(self, args):
+        # Les scripts affichent leurs avertissements : on les masque pendant la mesure
+        with redirect_stdout(io.StringIO()):
+            return self.fn(*args)
+
+
+IMPLEMENTATIONS = [
+    Implementation("SaaSlogic", lambda: load_app_function("SaaSlogic"), "transcript"),
+    Implementation("SaaSlogic (lignes)", lambda: load_app_function("SaaSlogic"), "transcript", drop_fields=()),
+    Implementation("api", lambda: load_app_function("api"), "transcript"),
+    Implementation("script2", lambda: load_function("tojrab/script2.py", "adjust_chapter_timestamps"), "sentences"),
+    Implementation("script3", lambda: load_function("tojrab/script3.py", "assign_timestamps"), "raw", transcript_first=True),
+    Implementation("script5", lambda: load_function("tojrab/script5.py", "assign_timestamps"), "sentences"),
+    Implementation("script6", lambda: load_function("tojrab/script6.py", "assign_timestamps"), "raw", transcript_first=True),
+    Implementation("malik", lambda: load_function("tojrab/malik.py", "assign_timestamps"), "sentences"),
+    Implementation("malik8", lambda: load_function("tojrab/malik8.py", "assign_timestamps"), "sentences"),
+    Implementation("malikpromax", lambda: load_function("tojrab/malikpromax.py", "assign_timestamps"), "sentences"),
+    Implementation("balajdida", lambda: load_function("tojrab/balajdida.py", "assign_timestamps"), "sentences"),
+    Implementation("balajdida2", lambda: load_function("tojrab/balajdida2.py", "assign_timestamps"), "sentences"),
+    Implementation("test", lambda: load_function("tojrab/test.py", "assign_timestamps"), "raw", transcript_first=True),
+]
+
+
+def boundary_errors(result, truth, titles):
+    """ (erreurs absolues en secondes des bornes trouvées, nombre de bornes attendues) """
+    by_title = {}
+    for chapter in result or []:
+        start = to_seconds(chapter.get("start_time", chapter.get("start")))
+        end = to_seconds(chapter.get("end_time", chapter.get("end")))
+        by_title[chapter["title"]] = (start, end)
+
+    errors = []
+    for title, expected in zip(titles, truth):
+        for found, real in zip(by_title.get(title, (None, None)), expected):
+            if found is not None:
+                errors.append(abs(found - real))
+    return errors, 2 * len(truth)
+
+
+def measure(implementation, args, repeat, budget):
+    """ Meilleur temps, pic mémoire et résultat d'une implémentation ; lève l'erreur éventuelle """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = implementation.run(args)
+        timings.append(time.perf_counter() - started)
+        if sum(timings) > budget:
+            break
+
+    tracemalloc.start()
+    try:
+        implementation.run(args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--chapters", type=int, default=None,
+                        help="nombre de chapitres (par défaut : un pour 250 segments, entre 5 et 40)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--noise", type=float, default=0.0, help="fraction des mots des scripts remplacés")
+    parser.add_argument("--budget", type=float, default=20.0,
+                        help="au-delà (secondes par taille), l'implémentation est ignorée pour les tailles suivantes")
+    parser.add_argument("--only", nargs="+", default=None, help="noms des implémentations à mesurer")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    implementations = [impl for impl in IMPLEMENTATIONS if not args.only or impl.name in args.only]
+    skipped = {}
+
+    # Premier appel hors mesure : imports différés (numpy, aligner) et caches de l'interpréteur
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(rng)
+    entries = make_transcript(20, rng, vocabulary)
+    chapters, _ = make_chapters(entries, 2, rng, vocabulary)
+    inputs = {"raw": entries, "transcript": Transcript.from_entries(entries), "sentences": sentences(entries)}
+    for implementation in implementations:
+        try:
+            implementation.run(implementation.prepare(inputs, chapters))
+        except Exception:
+            pass  # l'échec est rapporté pendant la mesure
+
+    for size in args.sizes:
+        rng = random.Random(args.seed + size)
+        vocabulary = make_vocabulary(rng)
+        entries = make_transcript(size, rng, vocabulary)
+        count = args.chapters or max(5, min(40, size // 250))
+        chapters, truth = make_chapters(entries, count, rng, vocabulary, args.noise)
+        titles = [chapter["title"] for chapter in chapters]
+        inputs = {"raw": entries, "transcript": Transcript.from_entries(entries), "sentences": sentences(entries)}
+
+        print(f"=== {size} segments, {len(chapters)} chapitres, bruit {args.noise:.0%} ===")
+        print(f"  {'implémentation':<20} {'temps':>10} {'segments/s':>12} {'mémoire':>10} {'erreur moy.':>12} {'bornes':>8}")
+        for implementation in implementations:
+            if implementation.name in skipped:
+                print(f"  {implementation.name:<20} ignorée ({skipped[implementation.name]})")
+                continue
+            try:
+                seconds, peak, result = measure(implementation, implementation.prepare(inputs, chapters),
+                                                args.repeat, args.budget)
+            except Exception as e:
+                print(f"  {implementation.name:<20} échec : {type(e).__name__}: {e}")
+                continue
+            if seconds > args.budget:
+                skipped[implementation.name] = f"{seconds:.1f}s à {size} segments"
+
+            errors, expected = boundary_errors(result, truth, titles)
+            mean_error = f"{sum(errors) / len(errors):10.2f} s" if errors else f"{'-':>12}"
+            print(f"  {implementation.name:<20} {seconds * 1000:8.1f} ms {size / seconds:12.0f} "
+                  f"{peak / 1024:7.0f} KiB {mean_error} {len(errors) / expected:8.0%}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import os
+import json
+import asyncio
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Dossier partagé par tous les workers d'une même machine
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+class TieredCache:
+    """ Cache à deux niveaux : LRU en mémoire devant un stockage SQLite sur disque
+
+    ttl (secondes) fait expirer les entrées, max_disk_items borne la taille du
+    fichier SQLite en supprimant les entrées les moins récemment utilisées.
+    serialize/deserialize convertissent les valeurs vers et depuis le JSON
+    stocké sur disque ; la couche mémoire garde l'objet d'origine.
+    """
+
+    # Nombre d'écritures entre deux passes d'éviction sur disque
+    EVICT_EVERY = 50
+
+    def __init__(self, name, max_items=256, db_path=None, ttl=None, max_disk_items=None,
+                 serialize=None, deserialize=None):
+        self.name = name
+        self.serialize = serialize or (lambda value: value)
+        self.deserialize = deserialize or (lambda value: value)
+        self.max_items = max_items
+        self.ttl = ttl
+        self.max_disk_items = max_disk_items
+        self._writes = 0
+        self.db_path = db_path or os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connection()
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+        for column in ("created_at", "accessed_at"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE entries ADD COLUMN {column} REAL NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+        conn.commit()
+
+    def _connection(self):
+        """ Une connexion SQLite par thread (les connexions ne sont pas partageables) """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            # WAL : lectures concurrentes entre processus pendant une écriture
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    def _remember(self, key, value, created_at):
+        with self._lock:
+            self._memory[key] = (value, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_items:
+                self._memory.popitem(last=False)
+
+    def _get_memory(self, key):
+        """ Valeur du niveau mémoire, ou None """
+        with self._lock:
+            if key in self._memory:
+                value, created_at = self._memory[key]
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.hits_memory += 1
+                    return value
+                del self._memory[key]
+        return None
+
+    def get(self, key):
+        """ Retourne la valeur en cache ou None """
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+
+        conn = self._connection()
+        row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or self._expired(row[1]):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        value = self.deserialize(json.loads(row[0]))
+        self._remember(key, value, row[1])
+        with self._lock:
+            self.hits_disk += 1
+        return value
+
+    def set(self, key, value):
+        """ Enregistre une valeur (sérialisable en JSON après serialize) dans les deux niveaux """
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(self.serialize(value), ensure_ascii=False), now, now)
+        )
+        conn.commit()
+        self._remember(key, value, now)
+
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % self.EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    async def aget(self, key):
+        """ Variante asyncio de get : la lecture SQLite se fait dans un thread, hors de la boucle """
+        value = self._get_memory(key)
+        if value is not None:
+            return value
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key, value):
+        """ Variante asyncio de set : l'écriture (et son attente du verrou SQLite) se fait dans un thread """
+        await asyncio.to_thread(self.set, key, value)
+
+    def evict(self):
+        """ Supprime du disque les entrées expirées et celles au-delà de max_disk_items """
+        conn = self._connection()
+        if self.ttl is not None:
+            conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl,))
+        if self.max_disk_items is not None:
+            conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                "SELECT key FROM entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_items,)
+            )
+        conn.commit()
+
+    def stats(self):
+        """ Compteurs de hits/miss pour dimensionner le cache """
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                "name": self.name,
+                "memory_items": len(self._memory),
+                "max_items": self.max_items,
+                "hits_memory": self.hits_memory,
+                "hits_disk": self.hits_disk,
+                "misses": self.misses,
+                "hit_rate": round((self.hits_memory + self.hits_disk) / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,146 @@
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from stages import submit_with_context
+
+# Requêtes "couvertes" : si Gemini n'a pas répondu après un délai adaptatif, un doublon
+# est envoyé et la première réponse gagne. Désactivé par défaut.
+HEDGE_ENABLED = os.getenv("GEMINI_HEDGING", "0") == "1"
+# Délai avant le doublon : ce percentile des latences récentes, borné par HEDGE_MIN_DELAY
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "1.0"))
+# Délai utilisé tant qu'il n'y a pas assez de mesures
+HEDGE_INITIAL_DELAY = float(os.getenv("HEDGE_INITIAL_DELAY", "10"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Budget : au plus cette fraction d'appels supplémentaires (0.1 = +10 % de dépense au maximum)
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.1"))
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "16"))
+
+
+def _retrieve_exception(task):
+    """ Lit l'exception d'une tâche perdante : sinon asyncio signale "Task exception was never retrieved" """
+    if not task.cancelled():
+        task.exception()
+
+
+class Hedger:
+    """ Lance un doublon des appels lents et garde la première réponse
+
+    Chaque appel gagne budget_ratio crédit (plafonné à max_credit) ; un
+    doublon coûte un crédit. Le nombre de doublons ne peut donc pas dépasser
+    budget_ratio fois le nombre d'appels, même en cas de ralentissement
+    général. Le perdant n'est pas annulé (l'appel HTTP est déjà parti) : sa
+    réponse est comptabilisée puis ignorée.
+    """
+
+    def __init__(self, name, percentile=HEDGE_PERCENTILE, min_delay=HEDGE_MIN_DELAY,
+                 initial_delay=HEDGE_INITIAL_DELAY, budget_ratio=HEDGE_BUDGET_RATIO,
+                 max_credit=10.0, window=500):
+        self.name = name
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.budget_ratio = budget_ratio
+        self.max_credit = max_credit
+        self.credit = 1.0
+        self.latencies = deque(maxlen=window)
+        # Pool dédié : les appels sont attendus depuis les threads du pool des étapes
+        self.executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix=f"hedge-{name}")
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "hedges_fired": 0, "hedges_won": 0, "hedges_skipped_budget": 0}
+
+    def delay(self):
+        """ Délai avant doublon : percentile des latences récentes """
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return self.initial_delay
+        index = min(len(samples) - 1, int(len(samples) * self.percentile / 100))
+        return max(self.min_delay, samples[index])
+
+    def _timed(self, fn, args):
+        started = time.monotonic()
+        result = fn(*args)
+        with self._lock:
+            self.latencies.append(time.monotonic() - started)
+        return result
+
+    def _take_credit(self):
+        with self._lock:
+            if self.credit >= 1:
+                self.credit -= 1
+                self._stats["hedges_fired"] += 1
+                return True
+            self._stats["hedges_skipped_budget"] += 1
+            return False
+
+    def call(self, fn, *args):
+        """ fn(*args), doublé si la réponse tarde ; retourne le premier résultat sans erreur """
+        with self._lock:
+            self._stats["calls"] += 1
+            self.credit = min(self.max_credit, self.credit + self.budget_ratio)
+
+        primary = submit_with_context(self.executor, self._timed, fn, args)
+        done, _ = wait([primary], timeout=self.delay())
+        if done or not self._take_credit():
+            return primary.result()
+
+        hedge = submit_with_context(self.executor, self._timed, fn, args)
+        done, pending = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        winner = primary if primary in done else hedge
+        if winner.exception() is not None and pending:
+            # Le premier a échoué : on attend l'autre plutôt que de renvoyer l'erreur
+            winner = pending.pop()
+            winner.exception()
+        if winner is hedge and winner.exception() is None:
+            with self._lock:
+                self._stats["hedges_won"] += 1
+        return winner.result()
+
+    async def _atimed(self, fn, args):
+        started = time.monotonic()
+        result = await fn(*args)
+        with self._lock:
+            self.latencies.append(time.monotonic() - started)
+        return result
+
+    async def acall(self, fn, *args):
+        """ Variante asyncio de call : fn retourne une coroutine, le doublon est une tâche de la boucle """
+        with self._lock:
+            self._stats["calls"] += 1
+            self.credit = min(self.max_credit, self.credit + self.budget_ratio)
+
+        primary = asyncio.ensure_future(self._atimed(fn, args))
+        done, _ = await asyncio.wait([primary], timeout=self.delay())
+        if done or not self._take_credit():
+            return await primary
+
+        hedge = asyncio.ensure_future(self._atimed(fn, args))
+        # Le perdant continue après notre retour : son éventuelle erreur est lue à sa fin
+        primary.add_done_callback(_retrieve_exception)
+        hedge.add_done_callback(_retrieve_exception)
+        done, pending = await asyncio.wait([primary, hedge], return_when=asyncio.FIRST_COMPLETED)
+        winner = primary if primary in done else hedge
+        if winner.exception() is not None and pending:
+            winner = pending.pop()
+            await asyncio.wait([winner])
+        if winner is hedge and winner.exception() is None:
+            with self._lock:
+                self._stats["hedges_won"] += 1
+        return winner.result()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["credit"] = round(self.credit, 2)
+            stats["samples"] = len(self.latencies)
+        stats["enabled"] = HEDGE_ENABLED
+        stats["delay"] = round(self.delay(), 3)
+        return stats
+
+
+gemini_hedger = Hedger("gemini")
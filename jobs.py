@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+
+from cache import CACHE_DIR
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+# Durée d'un bail : au-delà, un job "running" dont le worker ne donne plus signe de vie est repris
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+
+class JobQueue:
+    """ File de jobs durable sur SQLite, avec baux et nouvelles tentatives
+
+    Plusieurs processus d'une même machine peuvent consommer la même file :
+    un job est réservé par un bail que le worker prolonge tant qu'il
+    travaille. Si le worker meurt, le bail expire et le job est repris par un
+    autre worker. Le fichier doit être sur un disque local : le mode WAL de
+    SQLite ne fonctionne pas sur un système de fichiers réseau.
+    """
+
+    def __init__(self, db_path=JOBS_DB_PATH, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_expires_at REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        conn.commit()
+
+    def _connection(self):
+        """ Une connexion par thread, en mode autocommit pour gérer les transactions à la main """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, payload):
+        """ Ajoute un job et retourne son identifiant """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO jobs (id, payload, status, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?)",
+            (job_id, json.dumps(payload), now, now)
+        )
+        return job_id
+
+    def get(self, job_id):
+        """ Retourne l'état d'un job ou None s'il n'existe pas """
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "payload": json.loads(row["payload"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def claim(self, worker):
+        """ Réserve le plus ancien job disponible (en attente ou au bail expiré) """
+        conn = self._connection()
+        now = time.time()
+        # BEGIN IMMEDIATE : un seul worker à la fois peut réserver un job
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND lease_expires_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                "lease_expires_at = ?, updated_at = ? WHERE id = ?",
+                (worker, now + self.lease_seconds, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        job = self.get(row["id"])
+        if job["attempts"] > self.max_attempts:
+            self._finish(job["id"], worker, "failed", error="Nombre maximal de tentatives atteint")
+            return self.claim(worker)
+        return job
+
+    def heartbeat(self, job_id, worker):
+        """ Prolonge le bail ; retourne False si le job a été repris par un autre worker """
+        cursor = self._connection().execute(
+            "UPDATE jobs SET lease_expires_at = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'running'",
+            (time.time() + self.lease_seconds, time.time(), job_id, worker)
+        )
+        return cursor.rowcount == 1
+
+    def _finish(self, job_id, worker, status, result=None, error=None):
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires_at = NULL, updated_at = ? "
+            "WHERE id = ? AND worker = ?",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id, worker)
+        )
+
+    def complete(self, job_id, worker, result):
+        """ Marque le job comme terminé avec son résultat """
+        self._finish(job_id, worker, "done", result=result)
+
+    def fail(self, job_id, worker, error):
+        """ Remet le job en file, ou le marque en échec après max_attempts tentatives """
+        job = self.get(job_id)
+        status = "failed" if job and job["attempts"] >= self.max_attempts else "queued"
+        self._finish(job_id, worker, status, error=error)
+
+
+def run_worker(queue, handler, poll_interval=1.0, worker=None):
+    """ Boucle d'un worker : réserve un job, l'exécute avec handler(payload), enregistre le résultat """
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    print(f"Worker {worker} démarré")
+
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+
+        # Prolonge le bail en arrière-plan pendant le traitement
+        stop = threading.Event()
+
+        def keep_lease():
+            while not stop.wait(queue.lease_seconds / 3):
+                queue.heartbeat(job["id"], worker)
+
+        heartbeat_thread = threading.Thread(target=keep_lease, daemon=True)
+        heartbeat_thread.start()
+        try:
+            result = handler(job["payload"])
+            queue.complete(job["id"], worker, result)
+        except Exception as e:
+            print(f"Erreur job {job['id']} : {e}")
+            queue.fail(job["id"], worker, str(e))
+        finally:
+            stop.set()
+            heartbeat_thread.join()
@@ -0,0 +1,222 @@
+import os
+import json
+import hashlib
+import threading
+
+from cache import TieredCache
+from token_budget import check_input_budget, acheck_input_budget, with_output_budget, estimate_tokens, record_call
+from outbound import gemini
+from hedging import HEDGE_ENABLED, gemini_hedger
+from singleflight import host_lock, ahost_lock
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+response_cache = TieredCache(
+    "gemini_responses",
+    max_items=int(os.getenv("GEMINI_CACHE_SIZE", "512")),
+    ttl=int(os.getenv("GEMINI_CACHE_TTL", str(7 * 24 * 3600))),
+    max_disk_items=int(os.getenv("GEMINI_CACHE_DISK_ITEMS", "20000"))
+)
+
+_models = {}
+_models_lock = threading.Lock()
+_configured = False
+
+
+def get_model(model_name=DEFAULT_MODEL):
+    """ Retourne l'instance GenerativeModel partagée pour ce modèle
+
+    google.generativeai (~1 s d'import) n'est chargé et configuré qu'au
+    premier appel : les processus qui ne l'utilisent pas démarrent vite.
+    """
+    global _configured
+    with _models_lock:
+        if model_name not in _models:
+            import google.generativeai as genai
+            if not _configured:
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _configured = True
+            _models[model_name] = genai.GenerativeModel(model_name)
+        return _models[model_name]
+
+
+# Nom des verrous de génération : un même prompt n'est envoyé qu'une fois à Gemini à la
+# fois, sur toute la machine (par exemple le flux du résumé et le job d'analyse de l'UI)
+GENERATION_LOCK = "gemini_generation"
+
+
+def cache_key(prompt, model_name=DEFAULT_MODEL, generation_config=None):
+    """ Empreinte du triplet (modèle, configuration, prompt) """
+    payload = json.dumps([model_name, generation_config, prompt], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _generate(prompt, model_name, generation_config, input_tokens):
+    """ Un appel Gemini hors cache ; retourne le texte ou None """
+    response = gemini.call(
+        get_model(model_name).generate_content, prompt,
+        generation_config=generation_config, costs={"tokens": input_tokens}
+    )
+    return _response_text(response, model_name, input_tokens)
+
+
+async def _agenerate(prompt, model_name, generation_config, input_tokens):
+    """ Variante asyncio de _generate (generate_content_async) """
+    response = await gemini.acall(
+        get_model(model_name).generate_content_async, prompt,
+        generation_config=generation_config, costs={"tokens": input_tokens}
+    )
+    return _response_text(response, model_name, input_tokens)
+
+
+def _response_text(response, model_name, input_tokens):
+    """ Texte d'une réponse Gemini, enregistré dans le relevé des tokens ; None si vide """
+    if not response or not hasattr(response, "text"):
+        record_call(model_name, input_tokens, 0)
+        return None
+
+    text = response.text.strip()
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.prompt_token_count:
+        record_call(model_name, usage.prompt_token_count, usage.candidates_token_count)
+    else:
+        record_call(model_name, input_tokens, estimate_tokens(text))
+    return text
+
+
+def generate_text(prompt, model_name=DEFAULT_MODEL, generation_config=None, hedge=False):
+    """ Appelle Gemini et retourne le texte de la réponse, ou None si elle est vide
+
+    Une réponse déjà obtenue pour le même prompt est servie depuis le cache.
+    Avec hedge=True (et GEMINI_HEDGING=1), un appel qui tarde est doublé.
+    Lève PromptTooLarge si le prompt dépasse le budget en entrée.
+    """
+    generation_config = with_output_budget(generation_config)
+    input_tokens = check_input_budget(prompt, model_name)
+    key = cache_key(prompt, model_name, generation_config)
+    text = response_cache.get(key)
+    if text is not None:
+        record_call(model_name, input_tokens, estimate_tokens(text), cached=True)
+        return text
+
+    with host_lock(GENERATION_LOCK, key):
+        # Un autre appel a peut-être produit la réponse pendant qu'on attendait le verrou
+        text = response_cache.get(key)
+        if text is not None:
+            record_call(model_name, input_tokens, estimate_tokens(text), cached=True)
+            return text
+
+        if hedge and HEDGE_ENABLED:
+            text = gemini_hedger.call(_generate, prompt, model_name, generation_config, input_tokens)
+        else:
+            text = _generate(prompt, model_name, generation_config, input_tokens)
+        if text:
+            response_cache.set(key, text)
+        return text
+
+
+async def agenerate_text(prompt, model_name=DEFAULT_MODEL, generation_config=None, hedge=False):
+    """ Variante asyncio de generate_text : appel Gemini, cache et comptage des tokens sans bloquer la boucle """
+    generation_config = with_output_budget(generation_config)
+    input_tokens = await acheck_input_budget(prompt, model_name)
+    key = cache_key(prompt, model_name, generation_config)
+    text = await response_cache.aget(key)
+    if text is not None:
+        record_call(model_name, input_tokens, estimate_tokens(text), cached=True)
+        return text
+
+    async with ahost_lock(GENERATION_LOCK, key):
+        text = await response_cache.aget(key)
+        if text is not None:
+            record_call(model_name, input_tokens, estimate_tokens(text), cached=True)
+            return text
+
+        if hedge and HEDGE_ENABLED:
+            text = await gemini_hedger.acall(_agenerate, prompt, model_name, generation_config, input_tokens)
+        else:
+            text = await _agenerate(prompt, model_name, generation_config, input_tokens)
+        if text:
+            await response_cache.aset(key, text)
+        return text
+
+
+def stream_text(prompt, model_name=DEFAULT_MODEL, generation_config=None):
+    """ Variante de generate_text qui produit le texte au fil de la génération
+
+    Le texte complet est mis en cache à la fin ; une réponse déjà en cache
+    est produite en un seul morceau. Le verrou de génération est tenu pendant
+    tout le flux : un generate_text sur le même prompt attend ce texte au lieu
+    de rappeler Gemini.
+    """
+    generation_config = with_output_budget(generation_config)
+    input_tokens = check_input_budget(prompt, model_name)
+    key = cache_key(prompt, model_name, generation_config)
+    text = response_cache.get(key)
+    if text is not None:
+        record_call(model_name, input_tokens, estimate_tokens(text), cached=True)
+        yield text
+        return
+
+    with host_lock(GENERATION_LOCK, key):
+        text = response_cache.get(key)
+        if text is not None:
+            record_call(model_name, input_tokens, estimate_tokens(text), cached=True)
+            yield text
+            return
+
+        # Seule l'ouverture du flux est retentée : un texte déjà envoyé au client ne peut pas être repris
+        response = gemini.call(
+            get_model(model_name).generate_content, prompt,
+            generation_config=generation_config, stream=True, costs={"tokens": input_tokens}
+        )
+        parts = []
+        for chunk in response:
+            try:
+                chunk_text = chunk.text
+            except ValueError:
+                # Morceau sans texte (ex. uniquement des métadonnées de sécurité)
+                continue
+            parts.append(chunk_text)
+            yield chunk_text
+
+        text = "".join(parts).strip()
+        record_call(model_name, input_tokens, estimate_tokens(text))
+        if text:
+            response_cache.set(key, text)
+
+
+async def astream_text(prompt, model_name=DEFAULT_MODEL, generation_config=None):
+    """ Variante asyncio de stream_text """
+    generation_config = with_output_budget(generation_config)
+    input_tokens = await acheck_input_budget(prompt, model_name)
+    key = cache_key(prompt, model_name, generation_config)
+    text = await response_cache.aget(key)
+    if text is not None:
+        record_call(model_name, input_tokens, estimate_tokens(text), cached=True)
+        yield text
+        return
+
+    async with ahost_lock(GENERATION_LOCK, key):
+        text = await response_cache.aget(key)
+        if text is not None:
+            record_call(model_name, input_tokens, estimate_tokens(text), cached=True)
+            yield text
+            return
+
+        response = await gemini.acall(
+            get_model(model_name).generate_content_async, prompt,
+            generation_config=generation_config, stream=True, costs={"tokens": input_tokens}
+        )
+        parts = []
+        async for chunk in response:
+            try:
+                chunk_text = chunk.text
+            except ValueError:
+                continue
+            parts.append(chunk_text)
+            yield chunk_text
+
+        text = "".join(parts).strip()
+        record_call(model_name, input_tokens, estimate_tokens(text))
+        if text:
+            await response_cache.aset(key, text)
@@ -0,0 +1,196 @@
+import os
+import json
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from llm import generate_text
+from stages import submit_with_context
+from token_budget import estimate_tokens
+from transcripts import Transcript
+
+# Au-delà de ce nombre de tokens estimés, la transcription est traitée par morceaux
+MAP_REDUCE_THRESHOLD_TOKENS = int(os.getenv("MAP_REDUCE_THRESHOLD_TOKENS", "60000"))
+# Taille maximale d'un morceau (tokens estimés)
+MAP_CHUNK_TOKENS = int(os.getenv("MAP_CHUNK_TOKENS", "15000"))
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", "4"))
+# Taille minimale d'un morceau avant de chercher une frontière (tokens estimés)
+# Avec les valeurs par défaut, un morceau fait en moyenne ~80 % de MAP_CHUNK_TOKENS et la coupure
+# forcée à MAP_CHUNK_TOKENS (qui ne dépend plus du contenu) reste exceptionnelle
+MAP_CHUNK_MIN_TOKENS = int(os.getenv("MAP_CHUNK_MIN_TOKENS", str(MAP_CHUNK_TOKENS * 3 // 4)))
+# Une phrase sur CHUNK_BOUNDARY_EVERY (en moyenne) peut servir de frontière
+CHUNK_BOUNDARY_EVERY = int(os.getenv("CHUNK_BOUNDARY_EVERY", "32"))
+
+# Pool séparé du pool des étapes : les étapes l'utilisent et attendent ses résultats
+map_executor = ThreadPoolExecutor(max_workers=MAP_CONCURRENCY, thread_name_prefix="map")
+
+
+def transcript_tokens(transcription):
+    if isinstance(transcription, Transcript):
+        # Même estimation que estimate_tokens, calculée sur le tableau des longueurs
+        return int((transcription.text_lengths() // 4 + 1).sum())
+    return sum(estimate_tokens(entry["text"]) for entry in transcription)
+
+
+def needs_map_reduce(transcription):
+    # Un morceau ne doit jamais être redécoupé : les étapes map attendraient leur propre pool
+    return transcript_tokens(transcription) > max(MAP_REDUCE_THRESHOLD_TOKENS, MAP_CHUNK_TOKENS)
+
+
+def is_chunk_boundary(entry):
+    """ Frontière déterminée par le contenu de la phrase, pas par sa position """
+    return zlib.crc32(entry["text"].strip().lower().encode("utf-8")) % CHUNK_BOUNDARY_EVERY == 0
+
+
+def split_transcript(transcription, max_tokens=None, min_tokens=None):
+    """ Découpe la transcription en morceaux contigus dans le temps, sous le budget de tokens
+
+    Les frontières dépendent du texte des phrases : une correction locale ne
+    modifie que le ou les morceaux qui la contiennent, les autres gardent le
+    même texte et donc le même résumé en cache. Les morceaux sont des tranches
+    de la transcription (des vues, sans copie, pour une Transcript).
+    """
+    max_tokens = max_tokens or MAP_CHUNK_TOKENS
+    min_tokens = min_tokens or MAP_CHUNK_MIN_TOKENS
+    chunks = []
+    chunk_start = 0
+    current_tokens = 0
+
+    for i, entry in enumerate(transcription):
+        tokens = estimate_tokens(entry["text"])
+        if i > chunk_start and current_tokens + tokens > max_tokens:
+            chunks.append(transcription[chunk_start:i])
+            chunk_start = i
+            current_tokens = 0
+        current_tokens += tokens
+        if current_tokens >= min_tokens and is_chunk_boundary(entry):
+            chunks.append(transcription[chunk_start:i + 1])
+            chunk_start = i + 1
+            current_tokens = 0
+
+    if chunk_start < len(transcription):
+        chunks.append(transcription[chunk_start:])
+    return chunks
+
+
+def build_reduce_prompt(partial_summaries):
+    """ Prompt de fusion des résumés partiels """
+    parts = "\n\n".join(f"Partie {i + 1} :\n{summary}" for i, summary in enumerate(partial_summaries))
+    return f"""
+    Voici les résumés successifs des différentes parties d'une longue vidéo.
+    Fusionne-les en un seul résumé clair et concis, en français :
+
+    {parts}
+
+    Résumé :
+    """
+
+
+def summarize_chunk(chunk, build_summary_prompt):
+    """ Résumé d'un morceau ; le cache des réponses Gemini le réutilise tant que le prompt ne change pas """
+    return generate_text(build_summary_prompt(chunk))
+
+
+def map_summaries(transcription, build_summary_prompt):
+    """ Étape map : résume chaque morceau en parallèle, dans l'ordre du temps
+
+    Les frontières dépendent du contenu : après une correction locale, les
+    autres morceaux gardent le même prompt et leur résumé est servi par le
+    cache des réponses Gemini. Seuls les morceaux modifiés sont renvoyés.
+    """
+    chunks = split_transcript(transcription)
+    futures = [submit_with_context(map_executor, summarize_chunk, chunk, build_summary_prompt) for chunk in chunks]
+    return [summary for summary in (future.result() for future in futures) if summary]
+
+
+def summarize_map_reduce(transcription, build_summary_prompt):
+    """ Résume chaque morceau en parallèle, puis fusionne les résumés partiels """
+    return generate_text(build_reduce_prompt(map_summaries(transcription, build_summary_prompt)), hedge=True)
+
+
+def build_chapter_merge_prompt(chapters):
+    """ Prompt de fusion des chapitres obtenus morceau par morceau """
+    listing = "\n".join(
+        f"[{i}] lignes {chapter.get('start_line', '?')}-{chapter.get('end_line', '?')} : "
+        f"{chapter.get('title', '')} — {chapter.get('content', '')}"
+        for i, chapter in enumerate(chapters)
+    )
+    return f"""
+    Voici les chapitres successifs d'une longue vidéo, segmentée partie par partie : la coupure
+    entre deux parties tombe souvent au milieu d'un sujet.
+    Regroupe les chapitres consécutifs qui traitent du même sujet.
+    Retourne une liste de chapitres au format JSON, dans l'ordre, où chaque numéro apparaît une seule fois :
+    [
+      {{"title": "Nom du chapitre", "content": "Description courte du chapitre", "chapters": [0, 1]}}
+    ]
+    Chapitres :
+    {listing}
+    Assure-toi que la réponse soit bien formatée en JSON.
+    """
+
+
+def merge_chapters(chapters, groups):
+    """ Applique les regroupements renvoyés par Gemini ; None s'ils ne couvrent pas les chapitres dans l'ordre """
+    if not isinstance(groups, list):
+        return None
+    indexes = [group.get("chapters") if isinstance(group, dict) else None for group in groups]
+    if not all(isinstance(group, list) and group for group in indexes):
+        return None
+    if [i for group in indexes for i in group] != list(range(len(chapters))):
+        return None
+
+    merged = []
+    for group, members in zip(groups, indexes):
+        first, last = chapters[members[0]], chapters[members[-1]]
+        chapter = dict(first)
+        chapter["title"] = group.get("title") or first.get("title")
+        chapter["content"] = group.get("content") or first.get("content")
+        if "end_line" in last:
+            chapter["end_line"] = last["end_line"]
+        for field in ("script", "summary"):
+            if any(chapters[i].get(field) for i in members):
+                chapter[field] = " ".join(chapters[i].get(field) or "" for i in members).strip()
+        merged.append(chapter)
+    return merged
+
+
+def reduce_chapters(chapters):
+    """ Étape reduce de la segmentation : regroupe les chapitres coupés par les frontières des morceaux """
+    try:
+        text = generate_text(build_chapter_merge_prompt(chapters), hedge=True)
+        groups = json.loads(text.replace("```json", "").replace("```", "").strip())
+    except Exception as e:
+        print(f"Erreur fusion des chapitres : {e}")
+        return chapters
+    merged = merge_chapters(chapters, groups)
+    if merged is None:
+        print("Fusion des chapitres ignorée : regroupements invalides")
+        return chapters
+    return merged
+
+
+def segment_map_reduce(transcription, segment):
+    """ Segmente chaque morceau en parallèle, puis fusionne les chapitres dans l'ordre du temps
+
+    Les numéros de ligne (start_line/end_line), relatifs au morceau, sont
+    ramenés à la transcription complète. L'étape reduce regroupe ensuite les
+    chapitres consécutifs sur le même sujet, en particulier de part et
+    d'autre d'une frontière de morceau.
+    """
+    chunks = split_transcript(transcription)
+    chapters = []
+    futures = [submit_with_context(map_executor, segment, chunk) for chunk in chunks]
+    first_line = 0
+    for chunk, chunk_chapters in zip(chunks, (future.result() for future in futures)):
+        for chapter in chunk_chapters or []:
+            for field in ("start_line", "end_line"):
+                try:
+                    # Gemini renvoie parfois les numéros sous forme de texte ("12")
+                    chapter[field] = int(chapter[field]) + first_line
+                except (KeyError, TypeError, ValueError):
+                    pass
+            chapters.append(chapter)
+        first_line += len(chunk)
+
+    if len(chunks) > 1 and len(chapters) > 1:
+        chapters = reduce_chapters(chapters)
+    return chapters or None
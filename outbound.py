@@ -0,0 +1,318 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+
+# Limites par processus : avec N workers, diviser les quotas du projet par N
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "1000"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "4000000"))
+# Quota de l'API YouTube Data en unités par jour (videos().list coûte 1 unité)
+YOUTUBE_QUOTA_PER_DAY = int(os.getenv("YOUTUBE_QUOTA_PER_DAY", "10000"))
+YOUTUBE_QUOTA_BURST = int(os.getenv("YOUTUBE_QUOTA_BURST", "200"))
+TRANSCRIPT_RPM = int(os.getenv("TRANSCRIPT_RPM", "120"))
+
+# Attente maximale d'un limiteur avant d'abandonner l'appel (secondes)
+OUTBOUND_MAX_WAIT = float(os.getenv("OUTBOUND_MAX_WAIT", "30"))
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+# Échecs consécutifs avant ouverture du circuit, et durée d'ouverture
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+# Quota journalier épuisé côté service : circuit ouvert pendant cette durée avant un appel d'essai
+QUOTA_EXHAUSTED_SECONDS = float(os.getenv("QUOTA_EXHAUSTED_SECONDS", "600"))
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+# Exceptions de google.api_core et youtube_transcript_api, reconnues par leur nom
+# pour ne pas importer ces bibliothèques ici
+RETRYABLE_NAMES = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway",
+    # youtube_transcript_api 1.x : requêtes bloquées par YouTube (IpBlocked hérite de RequestBlocked)
+    "RequestBlocked", "IpBlocked",
+}
+# Raisons détaillées des HttpError de l'API YouTube Data, renvoyées avec un code 403
+RETRYABLE_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+QUOTA_REASONS = {"quotaExceeded", "dailyLimitExceeded"}
+
+
+class UpstreamUnavailable(RuntimeError):
+    """ L'appel sortant n'a pas été tenté : circuit ouvert ou quota épuisé """
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """ Le service amont est dégradé, les appels échouent immédiatement """
+
+
+class RateLimited(UpstreamUnavailable):
+    """ Le limiteur aurait imposé une attente supérieure à OUTBOUND_MAX_WAIT """
+
+
+class QuotaExhausted(UpstreamUnavailable):
+    """ Le service a refusé l'appel : quota du projet épuisé (quotaExceeded) """
+
+
+def http_status(error):
+    """ Code HTTP porté par une exception google.api_core ou googleapiclient, sinon None """
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+
+def error_reasons(error):
+    """ Raisons détaillées d'une HttpError de googleapiclient ("quotaExceeded", "rateLimitExceeded"...) """
+    content = getattr(error, "content", None)
+    if not isinstance(content, (bytes, str)):
+        return set()
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return set()
+    errors = body.get("error") if isinstance(body, dict) else None
+    if not isinstance(errors, dict):
+        return set()
+    details = (errors.get("errors") or []) + (errors.get("details") or [])
+    return {detail["reason"] for detail in details if isinstance(detail, dict) and detail.get("reason")}
+
+
+def is_quota_exhausted(error):
+    """ Quota du projet épuisé : inutile de réessayer avant sa remise à zéro """
+    return bool(error_reasons(error) & QUOTA_REASONS)
+
+
+def is_retryable(error):
+    """ Erreurs transitoires (limite de débit, surcharge, timeout) qui méritent une nouvelle tentative """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if http_status(error) in RETRYABLE_STATUS or type(error).__name__ in RETRYABLE_NAMES:
+        return True
+    return bool(error_reasons(error) & RETRYABLE_REASONS)
+
+
+def is_transient(error):
+    """ Échec passager, à retenter plus tard : service indisponible, quota local ou erreur transitoire """
+    return isinstance(error, UpstreamUnavailable) or is_retryable(error)
+
+
+class TokenBucket:
+    """ Seau à jetons : rate jetons par seconde, au plus capacity en réserve
+
+    Chaque appel réserve ses jetons (la réserve peut devenir négative) puis
+    attend leur remplissage, ce qui sert les appelants dans l'ordre d'arrivée.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1, max_wait=OUTBOUND_MAX_WAIT):
+        """ Réserve tokens jetons et retourne l'attente nécessaire (secondes), ou lève RateLimited """
+        # Un appel plus gros que le seau attend simplement un seau plein
+        tokens = min(tokens, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (tokens - self.tokens) / self.rate)
+            if wait > max_wait:
+                raise RateLimited(f"Quota local épuisé (attente estimée {wait:.0f}s)")
+            self.tokens -= tokens
+        return wait
+
+    def acquire(self, tokens=1, max_wait=OUTBOUND_MAX_WAIT):
+        """ Attend que tokens jetons soient disponibles, ou lève RateLimited """
+        wait = self.reserve(tokens, max_wait)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class CircuitBreaker:
+    """ Ouvre le circuit après failure_threshold échecs consécutifs
+
+    Circuit ouvert : les appels échouent immédiatement. Après reset_timeout,
+    un seul appel d'essai passe ("half_open") ; son succès referme le
+    circuit, son échec le rouvre.
+    """
+
+    def __init__(self, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.open_for = reset_timeout
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self, name):
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.open_for:
+                    raise CircuitOpen(f"Circuit {name} ouvert")
+                self.state = "half_open"
+                self._trial = False
+            if self.state == "half_open":
+                if self._trial:
+                    raise CircuitOpen(f"Circuit {name} en cours de test")
+                self._trial = True
+
+    def cancel_trial(self):
+        """ L'appel autorisé n'a pas eu lieu (quota local) : un autre pourra servir d'essai """
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.open_for = self.reset_timeout
+
+    def trip(self, duration):
+        """ Ouvre le circuit immédiatement, pour duration secondes """
+        with self._lock:
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.open_for = duration
+            self._trial = False
+
+
+class Upstream:
+    """ Point de passage des appels vers un service externe
+
+    Limiteurs à jetons, nouvelles tentatives avec délai exponentiel aléatoire
+    ("full jitter") sur les erreurs transitoires, et disjoncteur. Un quota
+    épuisé côté service ouvre directement le disjoncteur.
+    """
+
+    def __init__(self, name, limiters=None, breaker=None, max_attempts=RETRY_MAX_ATTEMPTS,
+                 base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.name = name
+        self.limiters = limiters or {}
+        self.breaker = breaker or CircuitBreaker()
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0, "throttled_seconds": 0.0}
+
+    def _count(self, field, amount=1):
+        with self._lock:
+            self._stats[field] += amount
+
+    def _admit(self, costs):
+        """ Passe le disjoncteur et réserve les jetons ; retourne l'attente imposée par les limiteurs """
+        try:
+            self.breaker.allow(self.name)
+        except CircuitOpen:
+            self._count("rejected")
+            raise
+        try:
+            wait = max([limiter.reserve(costs.get(name, 1)) for name, limiter in self.limiters.items()], default=0.0)
+        except RateLimited:
+            self.breaker.cancel_trial()
+            self._count("rejected")
+            raise
+        self._count("throttled_seconds", wait)
+        self._count("calls")
+        return wait
+
+    def _retry_delay(self, error, attempt):
+        """ Délai avant la tentative suivante, ou None si l'erreur doit remonter
+
+        Un quota épuisé ouvre le circuit pour QUOTA_EXHAUSTED_SECONDS et lève QuotaExhausted.
+        """
+        if is_quota_exhausted(error):
+            self.breaker.trip(QUOTA_EXHAUSTED_SECONDS)
+            self._count("failures")
+            raise QuotaExhausted(f"Quota {self.name} épuisé") from error
+        if not is_retryable(error):
+            # Erreur propre à la requête (404, transcription absente...) : le service répond
+            self.breaker.record_success()
+            return None
+        self.breaker.record_failure()
+        self._count("failures")
+        if attempt == self.max_attempts or self.breaker.state == "open":
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        print(f"Erreur {self.name} (tentative {attempt}/{self.max_attempts}), nouvel essai dans {delay:.1f}s : {error}")
+        self._count("retries")
+        return delay
+
+    def call(self, fn, *args, costs=None, **kwargs):
+        """ Appelle fn(*args, **kwargs) ; costs donne le nombre de jetons par limiteur (1 par défaut) """
+        costs = costs or {}
+        for attempt in range(1, self.max_attempts + 1):
+            wait = self._admit(costs)
+            if wait:
+                time.sleep(wait)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def acall(self, fn, *args, costs=None, **kwargs):
+        """ Variante asyncio de call : fn retourne une coroutine, les attentes ne bloquent pas la boucle """
+        costs = costs or {}
+        for attempt in range(1, self.max_attempts + 1):
+            wait = self._admit(costs)
+            if wait:
+                await asyncio.sleep(wait)
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["throttled_seconds"] = round(stats["throttled_seconds"], 3)
+        stats["circuit"] = self.breaker.state
+        return stats
+
+
+gemini = Upstream("gemini", limiters={
+    "requests": TokenBucket(GEMINI_RPM / 60, GEMINI_RPM),
+    "tokens": TokenBucket(GEMINI_TPM / 60, GEMINI_TPM),
+})
+youtube_data = Upstream("youtube", limiters={
+    "quota": TokenBucket(YOUTUBE_QUOTA_PER_DAY / 86400, YOUTUBE_QUOTA_BURST),
+})
+youtube_transcripts = Upstream("transcripts", limiters={
+    "requests": TokenBucket(TRANSCRIPT_RPM / 60, TRANSCRIPT_RPM),
+})
+
+
+def upstream_stats():
+    return {upstream.name: upstream.stats() for upstream in (gemini, youtube_data, youtube_transcripts)}
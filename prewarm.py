@@ -0,0 +1,32 @@
+import time
+
+from llm import get_model
+from transcripts import transcript_api
+from youtube_client import warm_up
+
+
+def prewarm():
+    """ Charge les dépendances lourdes avant la première requête et retourne la durée de chaque étape
+
+    Les imports de google.generativeai, googleapiclient et youtube_transcript_api
+    sont différés jusqu'au premier usage ; un serveur appelle prewarm() au
+    démarrage pour que la première requête n'en paie pas le coût.
+    """
+    steps = (
+        ("gemini", get_model),
+        ("youtube", warm_up),
+        ("transcripts", transcript_api),
+    )
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            print(f"Erreur pré-chauffage {name} : {e}")
+        timings[name] = round(time.perf_counter() - started, 3)
+    return timings
+
+
+if __name__ == "__main__":
+    print(prewarm())
@@ -0,0 +1,164 @@
+import os
+import asyncio
+import hashlib
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from concurrent.futures import Future
+
+try:
+    import fcntl
+except ImportError:  # Windows : la mutualisation reste limitée au processus
+    fcntl = None
+
+from cache import CACHE_DIR, TieredCache
+
+# Durée pendant laquelle un résultat calculé reste servi aux autres requêtes et workers
+SINGLEFLIGHT_RESULT_TTL = int(os.getenv("SINGLEFLIGHT_RESULT_TTL", "300"))
+LOCK_DIR = os.path.join(CACHE_DIR, "locks")
+
+
+def _lock_host(name, key):
+    """ Prend le verrou exclusif de la clé, partagé par les processus de la machine """
+    if fcntl is None:
+        return None
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    lock_file = open(os.path.join(LOCK_DIR, f"{name}-{digest}.lock"), "a")
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+
+def _unlock_host(lock_file):
+    if lock_file is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+@contextmanager
+def host_lock(name, key):
+    """ Section exclusive pour (name, key) entre les threads et les processus de la machine
+
+    Chaque entrée ouvre son propre descripteur : flock exclut aussi les
+    threads d'un même processus.
+    """
+    lock_file = _lock_host(name, key)
+    try:
+        yield
+    finally:
+        _unlock_host(lock_file)
+
+
+@asynccontextmanager
+async def ahost_lock(name, key):
+    """ Variante asyncio de host_lock : l'attente du verrou se fait dans un thread """
+    lock_file = await asyncio.to_thread(_lock_host, name, key)
+    try:
+        yield
+    finally:
+        _unlock_host(lock_file)
+
+
+class SingleFlight:
+    """ Mutualise les calculs identiques lancés en même temps
+
+    Dans un processus, le premier appel pour une clé calcule le résultat et
+    les appels concurrents attendent ce même calcul. Entre les workers d'une
+    même machine, un verrou fcntl par clé sérialise le calcul et le résultat
+    est publié dans un cache SQLite partagé, relu par les workers qui
+    attendaient le verrou.
+    """
+
+    def __init__(self, name, ttl=SINGLEFLIGHT_RESULT_TTL, max_items=128):
+        self.name = name
+        self.results = TieredCache(f"singleflight_{name}", max_items=max_items, ttl=ttl, max_disk_items=10000)
+        self._inflight = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, shareable=lambda result: True):
+        """ Retourne fn(), calculé une seule fois pour toutes les requêtes simultanées sur key
+
+        shareable(result) indique si le résultat peut être publié aux autres
+        workers (par exemple pas les erreurs amont, qui doivent être retentées).
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._compute(key, fn, shareable)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _compute(self, key, fn, shareable):
+        result = self.results.get(key)
+        if result is not None:
+            return result
+
+        with host_lock(self.name, key):
+            # Un autre worker a peut-être terminé le calcul pendant qu'on attendait le verrou
+            result = self.results.get(key)
+            if result is not None:
+                return result
+            result = fn()
+            if shareable(result):
+                self.results.set(key, result)
+            return result
+
+    async def ado(self, key, coro_fn, shareable=lambda result: True):
+        """ Variante asyncio de do : coro_fn() retourne une coroutine, calculée une seule fois par clé
+
+        Le calcul est une tâche de la boucle, protégée des annulations : un
+        client qui se déconnecte n'interrompt pas les autres requêtes en attente.
+        """
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._acompute(key, coro_fn, shareable))
+                self._tasks[key] = task
+                task.add_done_callback(lambda _: self._tasks.pop(key, None))
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _acompute(self, key, coro_fn, shareable):
+        # Lectures et écritures SQLite dans un thread : la boucle reste libre pendant l'attente du verrou
+        result = await self.results.aget(key)
+        if result is not None:
+            return result
+
+        async with ahost_lock(self.name, key):
+            result = await self.results.aget(key)
+            if result is not None:
+                return result
+            result = await coro_fn()
+            if shareable(result):
+                await self.results.aset(key, result)
+            return result
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight) + len(self._tasks),
+            }
+        return {**self.results.stats(), **stats}
@@ -0,0 +1,28 @@
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+# Pool partagé pour les étapes indépendantes du pipeline (appels réseau, donc des threads)
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "16"))
+
+executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="stage")
+
+
+def stage_result(future, default, name):
+    """ Attend le résultat d'une étape ; une erreur n'affecte que cette étape """
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"Erreur lors de l'étape {name} : {e}")
+        return default
+
+
+def submit_with_context(pool, fn, *args):
+    """ Comme pool.submit, en propageant le contexte (relevé des tokens de la requête) au thread """
+    context = contextvars.copy_context()
+    return pool.submit(context.run, fn, *args)
+
+
+def submit(fn, *args):
+    """ Lance une étape sur le pool partagé """
+    return submit_with_context(executor, fn, *args)
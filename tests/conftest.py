@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Modules à la racine du dépôt ; caches et file de tâches dans un dossier temporaire
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="assistant-tests-"))
@@ -0,0 +1,78 @@
+import random
+
+from aligner import TranscriptAligner, chapter_times
+from SaaSlogic import assign_timestamps
+
+
+def make_transcript(size, seed=0):
+    """ Segments synthétiques ; vocabulaire à distribution de Zipf, pour que les n-grammes se répètent """
+    rng = random.Random(seed)
+    vocabulary = [f"mot{i}" for i in range(300)]
+    weights = [1 / rank for rank in range(1, len(vocabulary) + 1)]
+    entries = []
+    start = 0.0
+    for _ in range(size):
+        duration = rng.uniform(1.5, 5.0)
+        entries.append({"text": " ".join(rng.choices(vocabulary, weights, k=rng.randint(4, 10))), "start": start, "duration": duration})
+        start += duration
+    return entries, vocabulary, rng
+
+
+def make_chapters(entries, count, rng, vocabulary, noise=0.0):
+    cuts = sorted(rng.sample(range(1, len(entries)), count - 1))
+    chapters = []
+    truth = []
+    for number, (first, stop) in enumerate(zip([0] + cuts, cuts + [len(entries)])):
+        words = " ".join(entry["text"] for entry in entries[first:stop]).split()
+        script = " ".join(rng.choice(vocabulary) if rng.random() < noise else word for word in words)
+        chapters.append({"title": f"Chapitre {number}", "content": "", "script": script})
+        last = entries[stop - 1]
+        truth.append((entries[first]["start"], last["start"] + last["duration"]))
+    return chapters, truth
+
+
+def test_exact_scripts_give_exact_boundaries():
+    entries, vocabulary, rng = make_transcript(2000)
+    chapters, truth = make_chapters(entries, 10, rng, vocabulary)
+
+    starts, ends = chapter_times(chapters, entries)
+
+    for start, end, (real_start, real_end) in zip(starts, ends, truth):
+        assert abs(start - real_start) < 1e-6
+        assert abs(end - real_end) < 1e-6
+
+
+def test_noisy_scripts_stay_near_their_chapter():
+    # Régression : une occurrence lointaine du trigramme de fin décalait tous les chapitres suivants
+    entries, vocabulary, rng = make_transcript(5000, seed=3)
+    chapters, truth = make_chapters(entries, 20, rng, vocabulary, noise=0.1)
+
+    result = assign_timestamps(chapters, entries)
+
+    for chapter, (real_start, real_end) in zip(result, truth):
+        assert abs(chapter["start_time"] - real_start) < 30
+        assert abs(chapter["end_time"] - real_end) < 30
+
+
+def test_times_never_run_backwards():
+    entries, vocabulary, rng = make_transcript(3000, seed=5)
+    chapters, _ = make_chapters(entries, 15, rng, vocabulary, noise=0.5)
+
+    result = assign_timestamps(chapters, entries)
+
+    previous_end = 0.0
+    for chapter in result:
+        assert previous_end <= chapter["start_time"] <= chapter["end_time"]
+        previous_end = chapter["end_time"]
+
+
+def test_distant_end_anchor_is_ignored():
+    entries = [{"text": " ".join(f"w{j}" for j in range(i * 10, i * 10 + 10)), "start": float(i), "duration": 1.0}
+               for i in range(100)]
+    aligner = TranscriptAligner(entries)
+
+    # La fin recopiée n'existe que 900 mots plus loin : elle ne doit pas être retenue
+    start, end = aligner.align(["w0 w1 w2 w3 w4 w900 w901 w902", "w8 w9 w10 w11 w12 w13"])[0]
+
+    assert start == 0
+    assert end is None or end < 20
@@ -0,0 +1,43 @@
+import pytest
+
+import SaaSlogic
+
+
+@pytest.fixture
+def fake_videos(monkeypatch):
+    """ videos().list simulé : toutes les vidéos existent sauf celles dont l'id commence par "missing" """
+    def get_infos(video_ids):
+        return {video_id: {"title": video_id} for video_id in video_ids if not video_id.startswith("missing")}
+    monkeypatch.setattr(SaaSlogic, "get_youtube_videos_info", get_infos)
+
+
+def test_results_follow_input_order(fake_videos):
+    videos = SaaSlogic.batch_video_infos([
+        "abcdefghijk", "bad", "https://youtu.be/bbcdefghijk", "missing1234", "https://youtube.com/watch?v=abcdefghijk",
+    ])
+
+    assert videos == [
+        {"video_id": "abcdefghijk", "title": "abcdefghijk"},
+        {"url": "bad", "error": "URL YouTube invalide"},
+        {"video_id": "bbcdefghijk", "title": "bbcdefghijk"},
+        {"video_id": "missing1234", "error": "Vidéo non trouvée"},
+    ]
+
+
+@pytest.mark.parametrize("body", [
+    ["abcdefghijk"],
+    {"urls": "abcdefghijk"},
+    {"urls": ["abcdefghijk", 42]},
+    {"ids": {"id": "abcdefghijk"}},
+])
+def test_batch_route_rejects_malformed_bodies(fake_videos, body):
+    response = SaaSlogic.app.test_client().post("/video_info/batch", json=body)
+
+    assert response.status_code == 400
+
+
+def test_batch_route_accepts_a_list_of_urls(fake_videos):
+    response = SaaSlogic.app.test_client().post("/video_info/batch", json={"urls": ["abcdefghijk"]})
+
+    assert response.status_code == 200
+    assert response.get_json() == {"videos": [{"video_id": "abcdefghijk", "title": "abcdefghijk"}]}
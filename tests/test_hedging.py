@@ -0,0 +1,30 @@
+import gc
+import asyncio
+
+from hedging import Hedger
+
+
+def test_losing_task_error_is_retrieved():
+    hedger = Hedger("test", initial_delay=0.05)
+    calls = []
+
+    async def call():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            # Appel principal : lent, puis en échec après la victoire du doublon
+            await asyncio.sleep(0.2)
+            raise RuntimeError("perdant")
+        return "doublon"
+
+    async def main():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        result = await hedger.acall(call)
+        await asyncio.sleep(0.3)
+        gc.collect()
+        return result, errors
+
+    result, errors = asyncio.run(main())
+
+    assert result == "doublon"
+    assert errors == []
@@ -0,0 +1,64 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from cache import CACHE_DIR
+from jobs import JobQueue
+
+
+@pytest.fixture
+def queue():
+    return JobQueue(db_path=os.path.join(CACHE_DIR, f"jobs-{uuid.uuid4().hex[:8]}.sqlite3"),
+                    lease_seconds=0.2, max_attempts=2)
+
+
+def test_job_is_claimed_once(queue):
+    job_id = queue.enqueue({"video_id": "abcdefghijk"})
+
+    job = queue.claim("worker-a")
+
+    assert job["id"] == job_id
+    assert job["payload"] == {"video_id": "abcdefghijk"}
+    assert queue.claim("worker-b") is None
+
+
+def test_expired_lease_is_taken_over(queue):
+    job_id = queue.enqueue({"video_id": "abcdefghijk"})
+    queue.claim("worker-a")
+
+    time.sleep(0.3)
+    job = queue.claim("worker-b")
+
+    assert job["id"] == job_id
+    assert job["attempts"] == 2
+    # L'ancien worker a perdu le job : son bail et son résultat sont ignorés
+    assert queue.heartbeat(job_id, "worker-a") is False
+    queue.complete(job_id, "worker-a", {"stale": True})
+    queue.complete(job_id, "worker-b", {"ok": True})
+    assert queue.get(job_id)["result"] == {"ok": True}
+
+
+def test_heartbeat_keeps_the_lease(queue):
+    job_id = queue.enqueue({})
+    queue.claim("worker-a")
+
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.heartbeat(job_id, "worker-a")
+    assert queue.claim("worker-b") is None
+
+
+def test_failed_job_is_retried_then_marked_failed(queue):
+    job_id = queue.enqueue({})
+
+    queue.claim("worker-a")
+    queue.fail(job_id, "worker-a", "erreur 1")
+    assert queue.get(job_id)["status"] == "queued"
+
+    queue.claim("worker-a")
+    queue.fail(job_id, "worker-a", "erreur 2")
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "erreur 2"
@@ -0,0 +1,78 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+import llm
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+
+
+class FakeModel:
+    """ Modèle Gemini simulé : compte les appels, génère lentement """
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_content(self, prompt, generation_config=None, stream=False):
+        self.calls += 1
+        parts = ["résumé ", "en ", "trois morceaux"]
+        if stream:
+            return self._stream(parts)
+        time.sleep(0.2)
+        return FakeResponse("".join(parts))
+
+    def _stream(self, parts):
+        for part in parts:
+            time.sleep(0.1)
+            yield FakeResponse(part)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeModel()
+    monkeypatch.setitem(llm._models, llm.DEFAULT_MODEL, fake)
+    return fake
+
+
+def test_generate_text_is_cached(model):
+    prompt = f"Résume {uuid.uuid4()}"
+
+    assert llm.generate_text(prompt) == "résumé en trois morceaux"
+    assert llm.generate_text(prompt) == "résumé en trois morceaux"
+    assert model.calls == 1
+
+
+def test_generate_text_waits_for_a_running_stream(model):
+    prompt = f"Résume {uuid.uuid4()}"
+    stream = llm.stream_text(prompt)
+    first = next(stream)
+
+    # Le job d'analyse demande le même résumé pendant que le flux est en cours
+    results = []
+    job = threading.Thread(target=lambda: results.append(llm.generate_text(prompt)))
+    job.start()
+    streamed = first + "".join(stream)
+    job.join()
+
+    assert streamed == "résumé en trois morceaux"
+    assert results == ["résumé en trois morceaux"]
+    assert model.calls == 1
+
+
+def test_concurrent_generations_share_one_call(model):
+    prompt = f"Résume {uuid.uuid4()}"
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(llm.generate_text(prompt))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["résumé en trois morceaux"] * 4
+    assert model.calls == 1
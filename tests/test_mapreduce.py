@@ -0,0 +1,92 @@
+import re
+import json
+
+import pytest
+
+import mapreduce
+from mapreduce import merge_chapters, segment_map_reduce, split_transcript
+from transcripts import join_text
+
+
+def make_transcript(lines):
+    return [{"text": f"phrase numéro {i} du sujet {i // 50}", "start": i * 3.0, "duration": 3.0} for i in range(lines)]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """ Morceaux d'environ 300 tokens : quelques dizaines de lignes par morceau """
+    monkeypatch.setattr(mapreduce, "MAP_CHUNK_TOKENS", 300)
+    monkeypatch.setattr(mapreduce, "MAP_CHUNK_MIN_TOKENS", 200)
+
+
+def segment_in_halves(chunk):
+    """ Segmentation simulée : deux chapitres par morceau, numéros de ligne en texte """
+    middle = len(chunk) // 2
+    return [
+        {"title": "début", "content": "", "start_line": "0", "end_line": str(middle - 1)},
+        {"title": "fin", "content": "", "start_line": str(middle), "end_line": str(len(chunk) - 1)},
+    ]
+
+
+def test_chunk_line_numbers_are_made_absolute(small_chunks, monkeypatch):
+    # Fusion refusée : les chapitres des morceaux sont conservés tels quels
+    monkeypatch.setattr(mapreduce, "generate_text", lambda prompt, **options: "pas du JSON")
+    transcript = make_transcript(200)
+
+    chapters = segment_map_reduce(transcript, segment_in_halves)
+
+    assert len(split_transcript(transcript)) > 1
+    assert chapters[0]["start_line"] == 0
+    assert chapters[-1]["end_line"] == 199
+    for previous, chapter in zip(chapters, chapters[1:]):
+        assert chapter["start_line"] == previous["end_line"] + 1
+
+
+def test_reduce_merges_chapters_across_chunks(small_chunks, monkeypatch):
+    def merge_all_but_first(prompt, **options):
+        count = len(re.findall(r"\[\d+\] lignes", prompt))
+        return json.dumps([
+            {"title": "Ouverture", "content": "a", "chapters": [0]},
+            {"title": "Suite", "content": "b", "chapters": list(range(1, count))},
+        ])
+
+    monkeypatch.setattr(mapreduce, "generate_text", merge_all_but_first)
+
+    chapters = segment_map_reduce(make_transcript(200), segment_in_halves)
+
+    assert [chapter["title"] for chapter in chapters] == ["Ouverture", "Suite"]
+    assert chapters[1]["start_line"] == chapters[0]["end_line"] + 1
+    assert chapters[1]["end_line"] == 199
+
+
+def test_merge_rejects_groups_that_skip_or_reorder_chapters():
+    chapters = [{"title": str(i), "start_line": i, "end_line": i} for i in range(3)]
+
+    assert merge_chapters(chapters, [{"chapters": [0, 1]}]) is None
+    assert merge_chapters(chapters, [{"chapters": [1, 0]}, {"chapters": [2]}]) is None
+    assert merge_chapters(chapters, {"chapters": [0, 1, 2]}) is None
+
+    merged = merge_chapters(chapters, [{"title": "A", "chapters": [0, 1]}, {"title": "B", "chapters": [2]}])
+    assert [(chapter["start_line"], chapter["end_line"]) for chapter in merged] == [(0, 1), (2, 2)]
+
+
+def test_chunks_average_near_the_budget():
+    transcript = [{"text": " ".join(f"mot{(i * 7 + j) % 5000}" for j in range(6 + i % 9)), "start": i, "duration": 1}
+                  for i in range(30000)]
+
+    chunks = split_transcript(transcript)
+    sizes = [mapreduce.transcript_tokens(chunk) for chunk in chunks]
+
+    assert max(sizes) <= mapreduce.MAP_CHUNK_TOKENS
+    assert sum(sizes[:-1]) / len(sizes[:-1]) > 0.7 * mapreduce.MAP_CHUNK_TOKENS
+
+
+def test_local_edit_only_changes_nearby_chunks():
+    transcript = make_transcript(20000)
+    edited = list(transcript)
+    edited[10000] = {**edited[10000], "text": "phrase corrigée"}
+
+    before = [join_text(chunk) for chunk in split_transcript(transcript)]
+    after = [join_text(chunk) for chunk in split_transcript(edited)]
+
+    assert len(set(before) - set(after)) <= 2
@@ -0,0 +1,70 @@
+import json
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import outbound
+from outbound import Upstream, CircuitOpen, QuotaExhausted, is_retryable
+
+
+def youtube_error(reason, status=403):
+    resp = httplib2.Response({"status": status})
+    resp.reason = "Forbidden"
+    body = {"error": {"code": status, "message": reason, "errors": [{"reason": reason, "domain": "youtube.quota"}]}}
+    return HttpError(resp, json.dumps(body).encode())
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(outbound.time, "sleep", lambda seconds: None)
+
+
+def test_youtube_rate_limit_is_retried(no_sleep):
+    upstream = Upstream("test")
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise youtube_error("rateLimitExceeded")
+        return "ok"
+
+    assert upstream.call(call) == "ok"
+    assert upstream.stats()["retries"] == 2
+
+
+def test_youtube_quota_opens_the_circuit(no_sleep):
+    upstream = Upstream("test")
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise youtube_error("quotaExceeded")
+
+    with pytest.raises(QuotaExhausted):
+        upstream.call(call)
+    assert attempts == [1]
+    with pytest.raises(CircuitOpen):
+        upstream.call(call)
+
+
+def test_request_errors_are_not_retried(no_sleep):
+    upstream = Upstream("test")
+
+    with pytest.raises(HttpError):
+        upstream.call(lambda: (_ for _ in ()).throw(youtube_error("forbidden")))
+    assert upstream.stats()["retries"] == 0
+    assert upstream.stats()["circuit"] == "closed"
+
+
+def test_transcript_blocking_errors_are_retryable():
+    class RequestBlocked(Exception):
+        pass
+
+    class IpBlocked(RequestBlocked):
+        pass
+
+    assert is_retryable(RequestBlocked())
+    assert is_retryable(IpBlocked())
+    assert not is_retryable(ValueError())
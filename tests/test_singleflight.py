@@ -0,0 +1,83 @@
+import time
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def new_flight():
+    return SingleFlight(f"test_{uuid.uuid4().hex[:8]}")
+
+
+def test_concurrent_calls_share_one_computation():
+    flight = new_flight()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 42}
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: flight.do("key", compute), range(8)))
+
+    assert calls == [1]
+    assert results == [{"value": 42}] * 8
+    assert flight.stats()["leaders"] == 1
+    assert flight.stats()["coalesced"] == 7
+
+
+def test_result_is_published_to_other_workers():
+    flight = new_flight()
+    flight.do("key", lambda: {"value": 1})
+
+    # Une autre instance du même nom (autre worker) relit le résultat publié
+    other = SingleFlight(flight.name)
+    assert other.do("key", lambda: pytest.fail("le calcul ne doit pas être relancé")) == {"value": 1}
+
+
+def test_unshareable_result_is_not_published():
+    flight = new_flight()
+    flight.do("key", lambda: {"error": "amont"}, shareable=lambda result: "error" not in result)
+
+    assert flight.do("key", lambda: {"value": 2}) == {"value": 2}
+
+
+def test_error_reaches_every_waiter_and_is_not_cached():
+    flight = new_flight()
+    started = threading.Event()
+
+    def failing():
+        started.set()
+        time.sleep(0.1)
+        raise RuntimeError("échec")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(flight.do, "key", failing)
+        started.wait()
+        follower = pool.submit(flight.do, "key", failing)
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError):
+                future.result()
+
+    assert flight.do("key", lambda: "ok") == "ok"
+
+
+def test_async_calls_share_one_computation():
+    flight = new_flight()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return [1, 2]
+
+    async def run():
+        return await asyncio.gather(*(flight.ado("key", compute) for _ in range(5)))
+
+    assert asyncio.run(run()) == [[1, 2]] * 5
+    assert calls == [1]
@@ -0,0 +1,56 @@
+import uuid
+
+import pytest
+
+import api
+from outbound import CircuitOpen
+from transcripts import Transcript
+
+TRANSCRIPT = Transcript.from_entries([{"text": "bonjour", "start": 0.0, "duration": 2.0}])
+
+
+@pytest.fixture
+def video_id():
+    return uuid.uuid4().hex[:11]
+
+
+@pytest.fixture
+def client():
+    return api.app.test_client()
+
+
+def test_transient_transcript_failure_is_retried(monkeypatch, client, video_id):
+    def unavailable(video_id):
+        raise CircuitOpen("youtube_transcripts")
+    monkeypatch.setattr(api, "fetch_transcript", unavailable)
+
+    response = client.get("/video_summary", query_string={"url": video_id})
+    assert response.status_code == 503
+
+    # Le 503 n'a pas été publié : la requête suivante refait l'appel
+    monkeypatch.setattr(api, "fetch_transcript", lambda video_id: TRANSCRIPT)
+    monkeypatch.setattr(api, "generate_summary", lambda transcription: "résumé")
+    monkeypatch.setattr(api, "segment_transcription_by_topics", lambda transcription, with_summaries=False: [])
+    response = client.get("/video_summary", query_string={"url": video_id})
+    assert response.status_code == 200
+    assert response.get_json()["summary"] == "résumé"
+
+
+def test_missing_transcript_is_a_404(monkeypatch, client, video_id):
+    def disabled(video_id):
+        raise ValueError("Subtitles are disabled for this video")
+    monkeypatch.setattr(api, "fetch_transcript", disabled)
+
+    response = client.get("/video_summary", query_string={"url": video_id})
+
+    assert response.status_code == 404
+
+
+def test_failed_summary_is_not_shared(monkeypatch, client, video_id):
+    monkeypatch.setattr(api, "fetch_transcript", lambda video_id: TRANSCRIPT)
+    monkeypatch.setattr(api, "segment_transcription_by_topics", lambda transcription, with_summaries=False: [])
+    monkeypatch.setattr(api, "generate_summary", lambda transcription: api.SUMMARY_ERROR)
+    assert client.get("/video_summary", query_string={"url": video_id}).get_json()["summary"] == api.SUMMARY_ERROR
+
+    monkeypatch.setattr(api, "generate_summary", lambda transcription: "résumé")
+    assert client.get("/video_summary", query_string={"url": video_id}).get_json()["summary"] == "résumé"
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from transcripts import Transcript, fetch_transcript, join_text
+
+ENTRIES = [
+    {"text": f"phrase {i}", "start": i * 2.5, "duration": 2.5}
+    for i in range(10)
+]
+
+
+@pytest.fixture
+def transcript():
+    return Transcript.from_entries(ENTRIES)
+
+
+def test_round_trip(transcript):
+    assert len(transcript) == 10
+    assert transcript.to_list() == ENTRIES
+    assert Transcript.from_entries(transcript) is transcript
+
+
+def test_segment_behaves_like_a_dict(transcript):
+    segment = transcript[3]
+
+    assert segment["text"] == "phrase 3"
+    assert segment["start"] == 7.5
+    assert segment.get("missing", "default") == "default"
+    with pytest.raises(KeyError):
+        segment["missing"]
+
+
+def test_slice_is_a_view(transcript):
+    view = transcript[2:5]
+
+    assert view.buffer is transcript.buffer
+    assert np.shares_memory(view.start_array(), transcript.starts)
+    assert view.to_list() == ENTRIES[2:5]
+    assert view.start_array().tolist() == [5.0, 7.5, 10.0]
+    assert view.text_lengths().tolist() == [8, 8, 8]
+
+
+def test_nested_and_negative_slices(transcript):
+    view = transcript[2:8][1:-1]
+
+    assert view.to_list() == ENTRIES[2:8][1:-1]
+    assert transcript[-3:].to_list() == ENTRIES[-3:]
+    assert view[-1]["text"] == "phrase 6"
+    assert transcript[-1]["text"] == "phrase 9"
+
+
+def test_out_of_range(transcript):
+    view = transcript[2:5]
+
+    with pytest.raises(IndexError):
+        view[3]
+    with pytest.raises(IndexError):
+        view[-4]
+    assert len(transcript[8:3]) == 0
+    assert not transcript[8:3]
+    assert transcript[20:].to_list() == []
+
+
+def test_step_is_rejected(transcript):
+    with pytest.raises(ValueError):
+        transcript[::2]
+
+
+def test_join(transcript):
+    view = transcript[1:4]
+
+    assert view.join() == "phrase 1 phrase 2 phrase 3"
+    assert view.join("\n") == "phrase 1\nphrase 2\nphrase 3"
+    assert transcript[5:5].join() == ""
+    assert join_text(view) == join_text(ENTRIES[1:4])
+
+
+class FakeFetched:
+    def to_raw_data(self):
+        return ENTRIES
+
+
+def test_fetch_transcript_uses_the_1x_api(monkeypatch):
+    from youtube_transcript_api import YouTubeTranscriptApi
+    calls = []
+
+    def fetch(self, video_id, languages=("en",), preserve_formatting=False):
+        calls.append((video_id, list(languages)))
+        return FakeFetched()
+    monkeypatch.setattr(YouTubeTranscriptApi, "fetch", fetch)
+
+    transcript = fetch_transcript("fetch1x0001")
+
+    assert calls == [("fetch1x0001", ["fr", "en"])]
+    assert transcript.to_list() == ENTRIES
+    # Deuxième appel servi par le cache
+    assert fetch_transcript("fetch1x0001").to_list() == ENTRIES
+    assert len(calls) == 1
@@ -0,0 +1,41 @@
+import pytest
+
+from video_ids import parse_video_id
+
+VIDEO_ID = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("value", [
+    VIDEO_ID,
+    f"  {VIDEO_ID}\n",
+    f"https://www.youtube.com/watch?v={VIDEO_ID}",
+    f"https://www.youtube.com/watch?v={VIDEO_ID}&t=30s&list=PL123",
+    f"https://www.youtube.com/watch?feature=share&v={VIDEO_ID}",
+    f"youtube.com/watch?v={VIDEO_ID}",
+    f"https://m.youtube.com/watch?v={VIDEO_ID}",
+    f"https://music.youtube.com/watch?v={VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}",
+    f"https://youtu.be/{VIDEO_ID}?si=abcdef",
+    f"https://www.youtube.com/shorts/{VIDEO_ID}",
+    f"https://www.youtube.com/embed/{VIDEO_ID}?start=10",
+    f"https://www.youtube-nocookie.com/embed/{VIDEO_ID}",
+    f"https://www.youtube.com/live/{VIDEO_ID}",
+    f"https://www.youtube.com/v/{VIDEO_ID}",
+])
+def test_recognized_forms(value):
+    assert parse_video_id(value) == VIDEO_ID
+
+
+@pytest.mark.parametrize("value", [
+    None,
+    "",
+    "abc",
+    f"{VIDEO_ID}x",
+    "https://www.youtube.com/watch?v=short",
+    f"https://example.com/watch?v={VIDEO_ID}",
+    f"https://www.youtube.com/channel/{VIDEO_ID}",
+    "https://youtu.be/",
+    f"https://notyoutube.com/embed/{VIDEO_ID}",
+])
+def test_invalid_values(value):
+    assert parse_video_id(value) is None
@@ -0,0 +1,52 @@
+""" Formatage des temps (secondes) au moment de la sérialisation des réponses """
+
+TIME_FORMATS = ("hms", "seconds", "iso")
+DEFAULT_TIME_FORMAT = "hms"
+
+
+def format_hms(seconds):
+    """ Secondes -> "HH:MM:SS" """
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+def format_iso_duration(seconds):
+    """ Secondes -> durée ISO-8601 ("PT1H2M3.5S") """
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600 * 1000)
+    minutes, milliseconds = divmod(milliseconds, 60 * 1000)
+    duration = "PT"
+    if hours:
+        duration += f"{hours}H"
+    if minutes:
+        duration += f"{minutes}M"
+    if milliseconds or duration == "PT":
+        duration += f"{milliseconds / 1000:g}S"
+    return duration
+
+
+def format_time(seconds, time_format=DEFAULT_TIME_FORMAT):
+    """ Formate un temps selon le format demandé par le client """
+    if seconds is None or isinstance(seconds, str):
+        # Résultats de jobs enregistrés avant le passage aux secondes : déjà formatés
+        return seconds
+    if time_format == "seconds":
+        return round(seconds, 3)
+    if time_format == "iso":
+        return format_iso_duration(seconds)
+    return format_hms(seconds)
+
+
+def format_chapters(chapters, time_format=DEFAULT_TIME_FORMAT):
+    """ Copie des chapitres avec start_time/end_time formatés ; les messages d'erreur passent tels quels """
+    if not isinstance(chapters, list):
+        return chapters
+    return [
+        {
+            **chapter,
+            "start_time": format_time(chapter["start_time"], time_format),
+            "end_time": format_time(chapter["end_time"], time_format),
+        }
+        for chapter in chapters
+    ]
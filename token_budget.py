@@ -0,0 +1,99 @@
+import os
+import asyncio
+import threading
+import contextvars
+
+# Budgets par appel (tokens) ; gemini-1.5-flash accepte ~1M tokens en entrée
+MAX_INPUT_TOKENS = int(os.getenv("LLM_MAX_INPUT_TOKENS", "900000"))
+MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", "8192"))
+# Au-delà de cette fraction du budget, l'estimation locale n'est plus assez fiable :
+# on demande le compte exact à l'API Gemini
+PRECISE_COUNT_RATIO = float(os.getenv("LLM_PRECISE_COUNT_RATIO", "0.8"))
+
+# Relevé des appels LLM de la requête en cours
+_ledger = contextvars.ContextVar("llm_ledger", default=None)
+_totals_lock = threading.Lock()
+_totals = {"calls": 0, "cached_calls": 0, "input_tokens": 0, "output_tokens": 0}
+
+
+class PromptTooLarge(ValueError):
+    """ Le prompt dépasse le budget de tokens en entrée """
+
+
+def estimate_tokens(text):
+    """ Estimation locale grossière : ~4 caractères par token """
+    return len(text) // 4 + 1
+
+
+def count_tokens(text, model_name):
+    """ Compte exact via l'API Gemini, avec repli sur l'estimation locale """
+    from llm import get_model
+    try:
+        return get_model(model_name).count_tokens(text).total_tokens
+    except Exception as e:
+        print(f"Erreur count_tokens : {e}")
+        return estimate_tokens(text)
+
+
+def check_input_budget(prompt, model_name, max_tokens=MAX_INPUT_TOKENS):
+    """ Retourne la taille du prompt en tokens, ou lève PromptTooLarge """
+    tokens = estimate_tokens(prompt)
+    if tokens > max_tokens * PRECISE_COUNT_RATIO:
+        tokens = count_tokens(prompt, model_name)
+    if tokens > max_tokens:
+        raise PromptTooLarge(f"Prompt trop long : {tokens} tokens (budget {max_tokens})")
+    return tokens
+
+
+async def acheck_input_budget(prompt, model_name, max_tokens=MAX_INPUT_TOKENS):
+    """ Variante asyncio de check_input_budget : le comptage précis (appel réseau) se fait dans un thread """
+    tokens = estimate_tokens(prompt)
+    if tokens > max_tokens * PRECISE_COUNT_RATIO:
+        tokens = await asyncio.to_thread(count_tokens, prompt, model_name)
+    if tokens > max_tokens:
+        raise PromptTooLarge(f"Prompt trop long : {tokens} tokens (budget {max_tokens})")
+    return tokens
+
+
+def with_output_budget(generation_config, max_tokens=MAX_OUTPUT_TOKENS):
+    """ Ajoute max_output_tokens à la configuration si l'appelant ne l'a pas fixé """
+    config = dict(generation_config or {})
+    config.setdefault("max_output_tokens", max_tokens)
+    return config
+
+
+def start_ledger():
+    """ Démarre le relevé des appels LLM pour la requête courante et le retourne """
+    ledger = []
+    _ledger.set(ledger)
+    return ledger
+
+
+def record_call(model_name, input_tokens, output_tokens, cached=False):
+    """ Enregistre la taille d'un appel dans le relevé courant et dans les totaux du processus """
+    entry = {"model": model_name, "input_tokens": input_tokens, "output_tokens": output_tokens, "cached": cached}
+    ledger = _ledger.get()
+    if ledger is not None:
+        ledger.append(entry)
+
+    with _totals_lock:
+        _totals["calls"] += 1
+        _totals["cached_calls"] += int(cached)
+        _totals["input_tokens"] += input_tokens
+        _totals["output_tokens"] += output_tokens
+
+
+def summarize_ledger(ledger):
+    """ Totaux d'un relevé (appels, tokens en entrée et en sortie, hors cache) """
+    billed = [entry for entry in ledger if not entry["cached"]]
+    return {
+        "calls": len(ledger),
+        "cached_calls": len(ledger) - len(billed),
+        "input_tokens": sum(entry["input_tokens"] for entry in billed),
+        "output_tokens": sum(entry["output_tokens"] for entry in billed),
+    }
+
+
+def usage_totals():
+    with _totals_lock:
+        return dict(_totals)
@@ -0,0 +1,172 @@
+import os
+import threading
+import numpy as np
+
+from cache import TieredCache
+from outbound import youtube_transcripts
+
+DEFAULT_LANGUAGES = ("fr", "en")
+
+
+class Segment:
+    """ Vue légère sur un segment d'une Transcript
+
+    Compatible avec l'ancien format : segment["text"], segment["start"],
+    segment["duration"] fonctionnent comme sur un dictionnaire.
+    """
+
+    __slots__ = ("text", "start", "duration")
+
+    def __init__(self, text, start, duration):
+        self.text = text
+        self.start = start
+        self.duration = duration
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def to_dict(self):
+        return {"text": self.text, "start": self.start, "duration": self.duration}
+
+
+class Transcript:
+    """ Transcription compacte : tableaux de débuts et de durées, texte dans un seul buffer
+
+    Le texte des segments est concaténé (séparé par "\\n") avec un tableau de
+    décalages ; une tranche transcript[a:b] est une vue qui partage ces
+    tableaux sans rien copier, et le texte n'est joint qu'à la demande.
+    """
+
+    __slots__ = ("buffer", "offsets", "starts", "durations", "_lo", "_hi")
+
+    SEPARATOR = "\n"
+
+    def __init__(self, buffer, offsets, starts, durations, lo=0, hi=None):
+        self.buffer = buffer
+        self.offsets = offsets  # len = nombre de segments + 1
+        self.starts = starts
+        self.durations = durations
+        self._lo = lo
+        self._hi = len(starts) if hi is None else hi
+
+    @classmethod
+    def from_entries(cls, entries):
+        """ Construit une Transcript depuis une liste de {"text", "start", "duration"} """
+        if isinstance(entries, cls):
+            return entries
+        texts = [entry["text"] for entry in entries]
+        lengths = np.fromiter((len(text) + 1 for text in texts), dtype=np.int64, count=len(texts))
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        starts = np.fromiter((entry["start"] for entry in entries), dtype=np.float64, count=len(texts))
+        durations = np.fromiter((entry["duration"] for entry in entries), dtype=np.float64, count=len(texts))
+        return cls(cls.SEPARATOR.join(texts) + cls.SEPARATOR, offsets, starts, durations)
+
+    def __len__(self):
+        return self._hi - self._lo
+
+    def __bool__(self):
+        return self._hi > self._lo
+
+    def text_at(self, i):
+        return self.buffer[self.offsets[i]:self.offsets[i + 1] - 1]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            lo, hi, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("Transcript ne supporte que les tranches contiguës")
+            return Transcript(self.buffer, self.offsets, self.starts, self.durations,
+                              self._lo + lo, self._lo + max(lo, hi))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        i = self._lo + index
+        return Segment(self.text_at(i), float(self.starts[i]), float(self.durations[i]))
+
+    def __iter__(self):
+        for i in range(self._lo, self._hi):
+            yield Segment(self.text_at(i), float(self.starts[i]), float(self.durations[i]))
+
+    def texts(self):
+        return [self.text_at(i) for i in range(self._lo, self._hi)]
+
+    def join(self, separator=" "):
+        """ Texte complet de la vue ; sans copie supplémentaire avec le séparateur "\\n" """
+        if not self:
+            return ""
+        text = self.buffer[self.offsets[self._lo]:self.offsets[self._hi] - 1]
+        if separator == self.SEPARATOR:
+            return text
+        return separator.join(self.texts())
+
+    def start_array(self):
+        return self.starts[self._lo:self._hi]
+
+    def duration_array(self):
+        return self.durations[self._lo:self._hi]
+
+    def text_lengths(self):
+        """ Longueur du texte de chaque segment """
+        return np.diff(self.offsets[self._lo:self._hi + 1]) - 1
+
+    def to_list(self):
+        """ Format d'origine, pour la sérialisation JSON """
+        return [segment.to_dict() for segment in self]
+
+
+def join_text(transcription, separator=" "):
+    """ Texte complet d'une Transcript ou d'une liste de segments """
+    if isinstance(transcription, Transcript):
+        return transcription.join(separator)
+    return separator.join(entry["text"] for entry in transcription)
+
+
+transcript_cache = TieredCache(
+    "transcripts",
+    max_items=int(os.getenv("TRANSCRIPT_CACHE_SIZE", "256")),
+    serialize=Transcript.to_list,
+    deserialize=Transcript.from_entries
+)
+
+
+_local = threading.local()
+
+
+def transcript_api():
+    """ Client youtube_transcript_api (1.x) du thread courant
+
+    Le module n'est importé qu'au premier téléchargement ; chaque thread garde
+    son client, dont la session requests n'est pas partagée entre threads.
+    """
+    api = getattr(_local, "api", None)
+    if api is None:
+        from youtube_transcript_api import YouTubeTranscriptApi
+        api = YouTubeTranscriptApi()
+        _local.api = api
+    return api
+
+
+def _fetch_entries(video_id, languages):
+    """ Segments {"text", "start", "duration"} de la première langue disponible """
+    return transcript_api().fetch(video_id, languages=languages).to_raw_data()
+    return YouTubeTranscriptApi
+
+
+def fetch_transcript(video_id, languages=DEFAULT_LANGUAGES):
+    """ Récupère la transcription, depuis le cache si la vidéo a déjà été analysée """
+    key = f"{video_id}|{','.join(languages)}"
+    transcript = transcript_cache.get(key)
+    if transcript is not None:
+        return transcript
+
+    entries = youtube_transcripts.call(_fetch_entries, video_id, list(languages))
+    transcript = Transcript.from_entries(entries)
+    transcript_cache.set(key, transcript)
+    return transcript
@@ -0,0 +1,42 @@
+import re
+from urllib.parse import urlparse, parse_qs
+
+# Les ids YouTube font 11 caractères parmi [A-Za-z0-9_-]
+VIDEO_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+YOUTUBE_HOSTS = {"youtube.com", "m.youtube.com", "music.youtube.com", "youtube-nocookie.com"}
+# youtube.com/embed/<id>, /shorts/<id>, /live/<id>, /v/<id>, /e/<id>
+ID_PATH_PREFIXES = {"embed", "shorts", "live", "v", "e"}
+
+
+def parse_video_id(value):
+    """ Id canonique d'une vidéo à partir d'une URL YouTube (toutes formes) ou d'un id brut ; None si invalide
+
+    Exemples reconnus : watch?v=<id>&t=30s, youtu.be/<id>?si=..., /shorts/<id>,
+    /embed/<id>, /live/<id>, m.youtube.com, music.youtube.com, youtube-nocookie.com.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if VIDEO_ID_RE.match(value):
+        return value
+
+    if "://" not in value:
+        value = "https://" + value
+    parsed = urlparse(value)
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    parts = [part for part in parsed.path.split("/") if part]
+
+    candidate = None
+    if host == "youtu.be":
+        candidate = parts[0] if parts else None
+    elif host in YOUTUBE_HOSTS:
+        candidate = parse_qs(parsed.query).get("v", [None])[0]
+        if not candidate and len(parts) >= 2 and parts[0] in ID_PATH_PREFIXES:
+            candidate = parts[1]
+
+    if candidate and VIDEO_ID_RE.match(candidate):
+        return candidate
+    return None
@@ -0,0 +1,8 @@
+from jobs import run_worker
+from SaaSlogic import job_queue, run_analysis_job
+from prewarm import prewarm
+
+# Lancer un ou plusieurs workers : python worker.py
+if __name__ == "__main__":
+    prewarm()
+    run_worker(job_queue, run_analysis_job)
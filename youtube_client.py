@@ -0,0 +1,71 @@
+import os
+import json
+import threading
+
+from outbound import youtube_data
+
+# Timeout des appels HTTP vers l'API YouTube Data (secondes)
+YOUTUBE_HTTP_TIMEOUT = int(os.getenv("YOUTUBE_HTTP_TIMEOUT", "10"))
+
+_document = None
+_client = None
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _discovery_document():
+    """ Charge une seule fois le document de découverte fourni avec googleapiclient """
+    global _document
+    from googleapiclient import discovery_cache
+    if _document is None:
+        _document = json.loads(discovery_cache.get_static_doc("youtube", "v3"))
+    return _document
+
+
+def _thread_http():
+    """ Connexion HTTP du thread courant
+
+    httplib2.Http n'est pas thread-safe : chaque thread garde la sienne (et sa
+    connexion keep-alive), ce qui forme un pool d'une connexion par thread.
+    """
+    http = getattr(_local, "http", None)
+    if http is None:
+        import httplib2
+        http = httplib2.Http(timeout=YOUTUBE_HTTP_TIMEOUT)
+        _local.http = http
+    return http
+
+
+def get_youtube_client():
+    """ Retourne le client YouTube du processus, construit une seule fois
+
+    Le client ne sert qu'à construire les requêtes, ce qui est sûr entre
+    threads : chaque requête est exécutée par execute() avec la connexion
+    HTTP du thread appelant.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                # Import différé : googleapiclient coûte ~0,2 s au démarrage du processus
+                import googleapiclient.discovery
+                _client = googleapiclient.discovery.build_from_document(
+                    _discovery_document(),
+                    developerKey=os.getenv("YOUTUBE_API_KEY"),
+                    http=_thread_http()
+                )
+    return _client
+
+
+def execute(request, quota_cost=1):
+    """ Exécute une requête de l'API YouTube Data via la couche d'appels sortants (quota, retries, disjoncteur) """
+    return youtube_data.call(lambda: request.execute(http=_thread_http()), costs={"quota": quota_cost})
+
+
+def warm_up():
+    """ À appeler au démarrage d'un worker pour ne pas payer la construction à la première requête
+
+    Le client est partagé par tous les threads ; seules les connexions HTTP,
+    peu coûteuses, sont ouvertes par thread à leur premier appel.
+    """
+    get_youtube_client()